@@ -0,0 +1,129 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import json
+import hashlib
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, abort
+from queries import (
+    venue_directory,
+    artist_directory,
+    venue_detail,
+    artist_detail,
+    current_time,
+    venue_list_watermark,
+    artist_list_watermark,
+    venue_watermark,
+    artist_watermark,
+    show_feed_watermark
+)
+from params import genre_args, show_feed_args, show_feed_page
+
+#----------------------------------------------------------------------------#
+# JSON api.
+#----------------------------------------------------------------------------#
+
+# The data of the venues, show_venue, show_artist and shows pages. Every
+# response carries a strong ETag derived from the watermark of what it lists
+# (see queries.py), so a client revalidating with If-None-Match gets a 304
+# after one aggregate query, before the response is built.
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+def to_json(value):
+    # query rows become objects and datetimes ISO 8601 strings
+    if hasattr(value, '_asdict'):
+        value = value._asdict()
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def resource_etag(watermark):
+    # the url is part of it, so filtered listings and pages differ
+    state = json.dumps([request.full_path, watermark], default=str)
+    return hashlib.sha1(state.encode()).hexdigest()
+
+
+def conditional(watermark, build):
+    # `build` runs only when the client's copy is out of date
+    if watermark is None:
+        abort(404)
+    etag = resource_etag(watermark)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(dict(success=True, **to_json(build())))
+    response.set_etag(etag)
+    # clients may keep the response but revalidate before every use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@api.route('/venues')
+def venues():
+    genres, match = genre_args()
+    return conditional(
+        venue_list_watermark(genres, match),
+        lambda: {'areas': list(venue_directory(genres, match))})
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    now = current_time()
+    return conditional(
+        venue_watermark(venue_id, now),
+        lambda: {'venue': venue_detail(venue_id, now)})
+
+
+@api.route('/artists')
+def artists():
+    genres, match = genre_args()
+    return conditional(
+        artist_list_watermark(genres, match),
+        lambda: {'artists': artist_directory(genres, match).all()})
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    now = current_time()
+    return conditional(
+        artist_watermark(artist_id, now),
+        lambda: {'artist': artist_detail(artist_id, now)})
+
+
+@api.route('/shows')
+def shows():
+    try:
+        watermark = show_feed_watermark(**show_feed_args())
+    except ValueError:
+        abort(400)
+
+    def build():
+        shows, next_cursor = show_feed_page()
+        return {'shows': shows, 'next_cursor': next_cursor}
+    return conditional(watermark, build)
+
+
+@api.errorhandler(400)
+def bad_request(error):
+    return jsonify({
+        'success': False,
+        'error': 400,
+        'message': 'bad request'
+    }), 400
+
+
+@api.errorhandler(404)
+def not_found(error):
+    return jsonify({
+        'success': False,
+        'error': 404,
+        'message': 'resource not found'
+    }), 404
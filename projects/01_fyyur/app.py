@@ -2,10 +2,8 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import sys
 import json
-import dateutil.parser
-import babel
+from datetime import datetime, timedelta, timezone
 from flask import (
     Flask,
     render_template,
@@ -14,39 +12,75 @@ from flask import (
     flash,
     redirect,
     url_for,
-    jsonify
+    jsonify,
+    stream_with_context,
+    abort
 )
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-import logging
-from logging import Formatter, FileHandler
 from flask_wtf import Form
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from forms import *
-from models import app, db, Venue, Artist, Show
+from models import app, db, Venue, Artist, Show, configure_engine, apply_changes
+from queries import (
+    venue_directory,
+    artist_directory,
+    genre_facets,
+    artist_detail,
+    venue_detail,
+    venue_availability,
+    current_time
+)
+from params import genre_args, show_feed_page
+from search import search_names, search_catalog
+from suggest import suggestions, refresh_suggestions, setup_suggestions
+from cache import page_cache, page_key, venue_page_keys, artist_page_keys
+from filters import format_datetime
+from commands import catalog_cli, VENUE_COLUMNS, ARTIST_COLUMNS
+from export import EXPORT_MIMETYPES, export_lines
+from logs import setup_logging
+from metrics import metrics, setup_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from querycount import setup_query_instrumentation
+from routing import setup_read_routing, read_from_replica
+from api import api
+from assets import assets_cli, setup_assets
+from templating import setup_templates
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
 app.config.from_object('config')
 moment = Moment(app)
+configure_engine(app)
 db.init_app(app)
+page_cache.configure(app.config)
+app.cli.add_command(catalog_cli)
+app.cli.add_command(assets_cli)
+setup_metrics(app)
+setup_query_instrumentation(app)
+setup_read_routing(app)
+app.register_blueprint(api)
+setup_assets(app)
 
 #----------------------------------------------------------------------------#
 # Filters.
 #----------------------------------------------------------------------------#
 
-
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+app.jinja_env.filters['datetime'] = format_datetime
+setup_templates(app)
+setup_suggestions(app)
 
 
-app.jinja_env.filters['datetime'] = format_datetime
+def stream_template(template_name, **context):
+    # render a template chunk by chunk, so large listings are sent while
+    # their rows are still being read from the database
+    app.update_template_context(context)
+    template = app.jinja_env.get_template(template_name)
+    stream = template.stream(context)
+    stream.enable_buffering(5)
+    return Response(stream_with_context(stream))
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -58,29 +92,59 @@ def index():
     return render_template('pages/home.html')
 
 
+#  Search
+#  ----------------------------------------------------------------
+
+@app.route('/search')
+def search():
+    # ranked venues and artists matching name, city, state, genres or
+    # seeking description, with the matched words highlighted
+    term = request.args.get('q', '')
+    results = search_catalog(term, page=request.args.get('page', 1, type=int))
+    return render_template(
+        'pages/search.html',
+        results=results,
+        search_term=term)
+
+
+@app.route('/search/suggest')
+def search_suggest():
+    # type-ahead suggestions from the in-process prefix index, brought up to
+    # date with the catalog every SUGGEST_REFRESH_SECONDS
+    refresh_suggestions(app.config['SUGGEST_REFRESH_SECONDS'])
+    return jsonify({
+        'success': True,
+        'suggestions': suggestions.suggest(request.args.get('q', ''))
+    })
+
+
+@app.route('/cache/stats')
+def cache_stats():
+    return jsonify({
+        'success': True,
+        'page_cache': page_cache.stats()
+    })
+
+
+@app.route('/metrics')
+def metrics_page():
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 #  Venues
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
 def venues():
-    # replace with real venues data.
-    # num_shows should be aggregated based on number of upcoming shows per venue.
-    # make groups by city, state and then use them as filters to create
-    # required data set
-
-    locals = []
-    venues = Venue.query.all()
-    for place in Venue.query.distinct(Venue.city, Venue.state).all():
-        locals.append({
-            'city': place.city,
-            'state': place.state,
-            'venues': [{
-                'id': venue.id,
-                'name': venue.name,
-            } for venue in venues if
-                venue.city == place.city and venue.state == place.state]
-        })
-    return render_template('pages/venues.html', areas=locals)
+    # venues are grouped by city, state and counted for upcoming shows in a
+    # single query, then streamed into the template area by area
+    genres, match = genre_args()
+    return stream_template(
+        'pages/venues.html',
+        areas=venue_directory(genres=genres, match=match),
+        facets=genre_facets(Venue, genres, match),
+        genres=genres,
+        match=match)
 
 @app.route('/venues/search', methods=['POST'])
 def search_venues():
@@ -88,14 +152,10 @@ def search_venues():
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live
     # Music & Coffee"
-    term = request.form['search_term']
-    sql_term = "%{}%".format(term)
-    venues = Venue.query.filter(Venue.name.ilike(sql_term)).all()
-
-    response = {
-        'count': len(venues)
-    }
-    response.update({'data': venues})
+    response = search_names(
+        Venue,
+        request.form.get('search_term', ''),
+        page=request.form.get('page', 1, type=int))
 
     return render_template(
         'pages/search_venues.html',
@@ -112,23 +172,51 @@ def show_venue(venue_id):
     # search for "Music" should return "The Musical Hop" and "Park Square Live
     # Music & Coffee"
 
-    venue = Venue.query.get(venue_id)
-
-    past_shows = list(filter(lambda x: x.start_time < datetime.today(), venue.shows))
-    upcoming_shows = list(filter(lambda x: x.start_time >= datetime.today(), venue.shows))
-
-    past_shows = list(map(lambda x: x.show_artist(), past_shows))
-    upcoming_shows = list(map(lambda x: x.show_artist(), upcoming_shows))
-
-    data = venue.format()
-
-    data['past_shows'] = past_shows
-    data['past_shows_count'] = len(past_shows)
-
-    data['upcoming_shows'] = upcoming_shows
-    data['upcoming_shows_count'] = len(upcoming_shows)
-
-    return render_template('pages/show_venue.html', venue=data)
+    key = page_key('venue', venue_id)
+    if key is not None:
+        page = page_cache.get(key)
+        if page is not None:
+            return page
+
+    # venue, shows and their artists come from a single joined query
+    data = venue_detail(venue_id)
+    if data is None:
+        abort(404)
+
+    page = render_template('pages/show_venue.html', venue=data)
+    if key is not None:
+        next_show = data['upcoming_shows'][0]['start_time'] if data['upcoming_shows'] else None
+        page_cache.set(key, page, expires_at=next_show,
+                       from_replica=read_from_replica())
+    return page
+
+
+@app.route('/venues/<int:venue_id>/availability')
+def venue_availability_feed(venue_id):
+    # free slots at a venue: ?start=<iso>&days=7&duration=<minutes>, from one
+    # query on the shows' (venue_id, during) GiST index
+    try:
+        start = request.args.get('start')
+        start = datetime.fromisoformat(start) if start else current_time()
+    except ValueError:
+        abort(400)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    days = max(1, min(request.args.get('days', 7, type=int), 31))
+    end = start + timedelta(days=days)
+    availability = venue_availability(
+        venue_id, start, end, request.args.get('duration', 120, type=int))
+
+    return jsonify({
+        'success': True,
+        'venue_id': venue_id,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'free': [{'start': lower.isoformat(), 'end': upper.isoformat()}
+                 for lower, upper in availability['free']],
+        'booked': [{'start': lower.isoformat(), 'end': upper.isoformat()}
+                   for lower, upper in availability['booked']]
+    })
 
 #  Create Venue
 #  ----------------------------------------------------------------
@@ -174,10 +262,11 @@ def create_venue_submission():
                 seeking_description=seeking_description)
             db.session.add(venue)
             db.session.commit()
+            suggestions.add('venue', venue.id, venue.name)
         except BaseException:
             error = True
             db.session.rollback()
-            print(sys.exc_info())
+            app.logger.exception('could not save venue')
         finally:
             db.session.close()
         if error:
@@ -207,12 +296,15 @@ def delete_venue(venue_id):
     error = False
 
     try:
+        cached_pages = venue_page_keys(venue_id)
         db.session.query(Venue).filter(Venue.id == venue_id).delete()
         db.session.commit()
+        suggestions.remove('venue', venue_id)
+        page_cache.invalidate(cached_pages)
     except BaseException:
         error = True
         db.session.rollback()
-        print("error on deleting venue!")
+        app.logger.exception('could not delete venue %s', venue_id)
     finally:
         db.session.close()
     if error:
@@ -226,8 +318,25 @@ def delete_venue(venue_id):
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-    data = Artist.query.all()
-    return render_template('pages/artists.html', artists=data)
+    genres, match = genre_args()
+    return stream_template(
+        'pages/artists.html',
+        artists=artist_directory(genres, match),
+        facets=genre_facets(Artist, genres, match),
+        genres=genres,
+        match=match)
+
+
+@app.route('/genres/facets')
+def genres_facets():
+    # per-genre counts for the venue or artist listing with the same filters
+    model = Artist if request.args.get('kind') == 'artists' else Venue
+    genres, match = genre_args()
+    return jsonify({
+        'success': True,
+        'facets': [{'genre': genre, 'count': count}
+                   for genre, count in genre_facets(model, genres, match)]
+    })
 
 
 @app.route('/artists/search', methods=['POST'])
@@ -235,14 +344,10 @@ def search_artists():
     # implement search on artists with partial string search. Ensure it is case-insensitive.
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    term = request.form['search_term']
-    sql_term = "%{}%".format(term)
-    artists = Artist.query.filter(Artist.name.ilike(sql_term)).all()
-
-    response = {
-        'count': len(artists)
-    }
-    response.update({'data': artists})
+    response = search_names(
+        Artist,
+        request.form.get('search_term', ''),
+        page=request.form.get('page', 1, type=int))
 
     return render_template(
         'pages/search_artists.html',
@@ -256,214 +361,143 @@ def search_artists():
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     # replace with real venue data from the venues table, using venue_id
-    artist = Artist.query.get(artist_id)
-
-    show_artist = {
-        'id': artist.id,
-        'name': artist.name,
-        'genres': artist.genres,
-        'city': artist.city,
-        'state': artist.state,
-        'phone': artist.phone,
-        'website': artist.website,
-        'facebook_link': artist.facebook_link,
-        'seeking_venue': artist.seeking_venue,
-        'seeking_description': artist.seeking_description,
-        'image_link': artist.image_link,
-        'past_shows_count': 0,
-        'upcoming_shows_count': 0
-    }
-
-    # query shows data by artist id filter and then set them either past shows or upcoming shows
-    # based on comparision with current time
-    past_shows = []
-    upcoming_shows = []
-    current_time = datetime.now()
-    shows = db.session.query(
-        Venue.id.label('venue_id'),
-        Venue.name.label('venue_name'),
-        Venue.image_link.label('venue_image_link'),
-        Show.start_time.label('start_time')).join(Show).filter(
-        Show.artist_id == artist_id).all()
-
-    if(shows):
-        for show in shows:
-            start_time = datetime.strptime(
-                show.start_time, '%Y-%m-%d %H:%M:%S')
-
-            if(current_time > start_time):
-                past_shows.append(show)
-            else:
-                upcoming_shows.append(show)
-
-        show_artist.update({
-            'past_shows': past_shows,
-            'upcoming_shows': upcoming_shows,
-            'past_shows_count': len(past_shows),
-            'upcoming_shows_count': len(upcoming_shows)
-        })
-
-    return render_template('pages/show_artist.html', artist=show_artist)
+    key = page_key('artist', artist_id)
+    if key is not None:
+        page = page_cache.get(key)
+        if page is not None:
+            return page
+
+    show_artist = artist_detail(artist_id)
+    if show_artist is None:
+        abort(404)
+
+    page = render_template('pages/show_artist.html', artist=show_artist)
+    if key is not None:
+        next_show = show_artist['upcoming_shows'][0].start_time if show_artist['upcoming_shows'] else None
+        page_cache.set(key, page, expires_at=next_show,
+                       from_replica=read_from_replica())
+    return page
 
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    form = ArtistForm()
-
     # populate form with fields from artist with ID <artist_id>
     artist = Artist.query.get(artist_id)
-
-    form.name.data = artist.name
-    form.city.data = artist.city
-    form.state.data = artist.state
-    form.address.data = artist.address
-    form.phone.data = artist.phone
-    form.image_link.data = artist.image_link
-    form.genres.data = artist.genres
-    form.website.data = artist.website
-    form.facebook_link.data = artist.facebook_link
-    form.seeking_venue.data = artist.seeking_venue
-    form.seeking_description.data = artist.seeking_description
+    if artist is None:
+        abort(404)
+    form = EditArtistForm(obj=artist)
 
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
+def edit_conflict(form_class, template, kind, record):
+    # the row changed since the form was loaded: nothing was saved, show the
+    # stored values (and their version) so the edit can be redone on top
+    flash('{} was changed by someone else while you were editing it. '
+          'Your changes were not saved; here are the current details.'.format(
+              record.name))
+    form = form_class(formdata=None, obj=record)
+    return render_template(template, form=form, **{kind: record}), 409
+
+
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
-    # take values from the form submitted, and update existing
-    # artist record with ID <artist_id> using the new attributes
+    # take values from the form submitted, and update only the columns that
+    # changed, provided the artist is still at the version the form showed
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        abort(404)
+    form = EditArtistForm(request.form)
+    if not form.validate():
+        return render_template(
+            'forms/edit_artist.html', form=form, artist=artist), 400
+    if form.version.data != str(artist.version):
+        return edit_conflict(
+            EditArtistForm, 'forms/edit_artist.html', 'artist', artist)
+
     error = False
     try:
-        artist = Artist.query.get(artist_id)
-
-        edit_name = request.form['name']
-        if edit_name is not artist.name:
-            artist.name = edit_name
-        edit_city = request.form['city']
-        if edit_city is not artist.city:
-            artist.city = edit_city
-        edit_state = request.form['state']
-        if edit_state is not artist.state:
-            artist.state = edit_state
-        edit_address = request.form['address']
-        edit_phone = request.form['phone']
-        if edit_phone is not artist.phone:
-            artist.phone = edit_phone
-        edit_genres = request.form.getlist('genres')
-        if edit_genres is not artist.genres:
-            artist.genres = edit_genres
-        edit_website = request.form['website']
-        if edit_website is not artist.website:
-            artist.website = edit_website
-        edit_facebook_link = request.form['facebook_link']
-        if edit_facebook_link is not artist.facebook_link:
-            artist.facebook_link = edit_facebook_link
-        edit_image_link = request.form['image_link']
-        if edit_image_link is not artist.image_link:
-            artist.image_link = edit_image_link
-        edit_seeking_venue = 'seeking_venue' in request.form
-        if(edit_seeking_venue is not artist.seeking_venue):
-            artist.seeking_venue = edit_seeking_venue
-        edit_seeking_description = request.form['seeking_description']
-        if edit_seeking_description is not artist.seeking_description:
-            artist.seeking_description = edit_seeking_description
-
+        changed = apply_changes(
+            artist, {name: form.data[name] for name in ARTIST_COLUMNS})
         db.session.commit()
+        if changed:
+            suggestions.add('artist', artist_id, artist.name)
+            page_cache.invalidate(artist_page_keys(artist_id))
+    except StaleDataError:
+        # a concurrent edit committed between our read and our UPDATE
+        db.session.rollback()
+        return edit_conflict(
+            EditArtistForm, 'forms/edit_artist.html', 'artist',
+            Artist.query.get(artist_id))
     except BaseException:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not update artist %s', artist_id)
     finally:
         db.session.close()
     if error:
         flash('An error occured while updating Artist ' + request.form['name'])
-    else:
-        return redirect(url_for('show_artist', artist_id=artist_id))
+        return redirect(url_for('edit_artist', artist_id=artist_id))
+    return redirect(url_for('show_artist', artist_id=artist_id))
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    form = EditVenueForm()
     venue = Venue.query.get(venue_id)
-
-    form.name.data = venue.name
-    form.city.data = venue.city
-    form.state.data = venue.state
-    form.address.data = venue.address
-    form.phone.data = venue.phone
-    form.image_link.data = venue.image_link
-    form.genres.data = venue.genres
-    form.website.data = venue.website
-    form.facebook_link.data = venue.facebook_link
-    form.seeking_talent.data = venue.seeking_talent
-    form.seeking_description.data = venue.seeking_description
+    if venue is None:
+        abort(404)
+    form = EditVenueForm(obj=venue)
 
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
-    # take values from the form submitted, and update existing
-    # venue record with ID <venue_id> using the new attributes
+    # take values from the form submitted, and update only the columns that
+    # changed, provided the venue is still at the version the form showed
+    venue = Venue.query.get(venue_id)
+    if venue is None:
+        abort(404)
     form = EditVenueForm(request.form)
-    if form.validate():
-        error = False
-        try:
-            venue = Venue.query.get(venue_id)
-
-            edit_name = request.form['name']
-            if edit_name is not venue.name:
-                venue.name = edit_name
-            edit_city = request.form['city']
-            if edit_city is not venue.city:
-                venue.city = edit_city
-            edit_state = request.form['state']
-            if edit_state is not venue.state:
-                venue.state = edit_state
-            edit_address = request.form['address']
-            if edit_address is not venue.address:
-                venue.address = edit_address
-            edit_phone = request.form['phone']
-            if edit_phone is not venue.phone:
-                venue.phone = edit_phone
-            edit_genres = request.form.getlist('genres')
-            if edit_genres is not venue.genres:
-                venue.genres = edit_genres
-            edit_website = request.form['website']
-            if edit_website is not venue.website:
-                venue.website = edit_website
-            edit_facebook_link = request.form['facebook_link']
-            if edit_facebook_link is not venue.facebook_link:
-                venue.facebook_link = edit_facebook_link
-            edit_image_link = request.form['image_link']
-            if edit_image_link is not venue.image_link:
-                venue.image_link = edit_image_link
-            edit_seeking_talent = 'seeking_talent' in request.form
-            if edit_seeking_talent is not venue.seeking_talent:
-                venue.seeking_talent = edit_seeking_talent
-            edit_seeking_description = request.form['seeking_description']
-            if edit_seeking_description is not venue.seeking_description:
-                venue.seeking_description = edit_seeking_description
+    if not form.validate():
+        return render_template(
+            'forms/edit_venue.html', form=form, venue=venue), 400
+    if form.version.data != str(venue.version):
+        return edit_conflict(
+            EditVenueForm, 'forms/edit_venue.html', 'venue', venue)
 
-            db.session.commit()
-        except BaseException:
-            error = True
-            db.session.rollback()
-            print(sys.exc_info())
-        finally:
-            db.session.close()
-        if error:
-            flash(
-                'An error occured while updating Venue ' +
-                request.form['name'])
-        else:
-            flash(
-                'Venue ' +
-                request.form['name'] +
-                ' was successfully updated!')
+    error = False
+    try:
+        changed = apply_changes(
+            venue, {name: form.data[name] for name in VENUE_COLUMNS})
+        db.session.commit()
+        if changed:
+            suggestions.add('venue', venue_id, venue.name)
+            page_cache.invalidate(venue_page_keys(venue_id))
+    except StaleDataError:
+        # a concurrent edit committed between our read and our UPDATE
+        db.session.rollback()
+        return edit_conflict(
+            EditVenueForm, 'forms/edit_venue.html', 'venue',
+            Venue.query.get(venue_id))
+    except BaseException:
+        error = True
+        db.session.rollback()
+        app.logger.exception('could not update venue %s', venue_id)
+    finally:
+        db.session.close()
+    if error:
+        flash(
+            'An error occured while updating Venue ' +
+            request.form['name'])
+    else:
+        flash(
+            'Venue ' +
+            request.form['name'] +
+            ' was successfully updated!')
 
-        return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('show_venue', venue_id=venue_id))
 
 
 #  Create Artist
@@ -506,10 +540,11 @@ def create_artist_submission():
             seeking_description=seeking_description)
         db.session.add(artist)
         db.session.commit()
+        suggestions.add('artist', artist.id, artist.name)
     except BaseException:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not save artist')
     finally:
         db.session.close()
     if error:
@@ -530,26 +565,35 @@ def create_artist_submission():
 
 @app.route('/shows')
 def shows():
-    # displays list of shows at /shows
-    # replace with real venues data.
-    # num_shows should be aggregated based on number of upcoming shows per
-    # venue.
-
-    data = []
-    shows = Show.query.all()
-    for show in shows:
-        venue = Venue.query.get(show.venue_id)
-        artist = Artist.query.get(show.artist_id)
-        data.append({
-            'venue_id': venue.id,
-            'venue_name': venue.name,
-            'artist_id': artist.id,
-            'artist_name': artist.name,
-            'artist_image_link': artist.image_link,
-            'start_time': show.start_time
-        })
-
-    return render_template('pages/shows.html', shows=data)
+    # displays one page of shows at /shows, fetched with a single joined
+    # query and paginated on (start_time, id)
+    shows, next_cursor = show_feed_page()
+
+    next_url = None
+    if next_cursor is not None:
+        args = {k: v for k, v in request.args.items() if k != 'after'}
+        next_url = url_for('shows', after=next_cursor, **args)
+
+    return render_template('pages/shows.html', shows=shows, next_url=next_url)
+
+
+@app.route('/shows/feed')
+def shows_feed():
+    shows, next_cursor = show_feed_page()
+
+    return jsonify({
+        'success': True,
+        'shows': [{
+            'id': show.id,
+            'venue_id': show.venue_id,
+            'venue_name': show.venue_name,
+            'artist_id': show.artist_id,
+            'artist_name': show.artist_name,
+            'artist_image_link': show.artist_image_link,
+            'start_time': show.start_time.isoformat()
+        } for show in shows],
+        'next_cursor': next_cursor
+    })
 
 
 @app.route('/shows/create')
@@ -559,26 +603,62 @@ def create_shows():
     return render_template('forms/new_show.html', form=form)
 
 
+# SQLSTATE of an exclusion constraint violation
+EXCLUSION_VIOLATION = '23P01'
+BOOKING_CONFLICTS = {
+    'venue_id_during_excl': 'the venue already has a show at that time',
+    'artist_id_during_excl': 'the artist already plays a show at that time'
+}
+
+
+def booking_conflict(error):
+    # which exclusion constraint a booking overlapped, if any; every shows
+    # partition has its own pair, named <partition>_<column>_during_excl
+    if getattr(error.orig, 'pgcode', None) == EXCLUSION_VIOLATION:
+        name = error.orig.diag.constraint_name or ''
+        for suffix in BOOKING_CONFLICTS:
+            if name.endswith(suffix):
+                return suffix
+    return None
+
+
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # insert form data as a new Show record in the db, instead
+    form = ShowForm(request.form)
+    if not form.validate():
+        return render_template('forms/new_show.html', form=form), 400
+
     error = False
     try:
         venue_id = request.form['venue_id']
         artist_id = request.form['artist_id']
-        start_time = request.form['start_time']
 
         show = Show(
             venue_id=venue_id,
             artist_id=artist_id,
-            start_time=start_time)
+            start_time=form.start_time.data,
+            # an empty field is allowed and means the default length
+            duration=form.duration.data or form.duration.default)
         db.session.add(show)
         db.session.commit()
+        page_cache.invalidate([
+            'venue:{}'.format(venue_id), 'artist:{}'.format(artist_id)])
+    except IntegrityError as e:
+        db.session.rollback()
+        conflict = BOOKING_CONFLICTS.get(booking_conflict(e))
+        if conflict is None:
+            app.logger.exception('could not save show')
+            error = True
+        else:
+            # rejected by the exclusion constraint's index probe
+            flash('Show could not be listed: {}.'.format(conflict))
+            return render_template('forms/new_show.html', form=form), 409
     except BaseException:
         error = True
         db.session.rollback()
-        print(sys.exc_info())
+        app.logger.exception('could not save show')
     finally:
         db.session.close()
     if error:
@@ -591,6 +671,27 @@ def create_show_submission():
     return render_template('pages/home.html')
 
 
+#  Export
+#  ----------------------------------------------------------------
+
+@app.route('/export/<any(venues, artists, shows):kind>')
+def export(kind):
+    # streams the whole table (or the rows changed since the `since`
+    # watermark) from a server-side cursor as a chunked response
+    format = request.args.get('format', 'ndjson')
+    if format not in EXPORT_MIMETYPES:
+        abort(400)
+    try:
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+    except ValueError:
+        abort(400)
+
+    return Response(
+        stream_with_context(export_lines(kind, format, since)),
+        mimetype=EXPORT_MIMETYPES[format])
+
+
 @app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
@@ -602,13 +703,7 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+    setup_logging(app)
 
 
 #----------------------------------------------------------------------------#
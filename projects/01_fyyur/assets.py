@@ -0,0 +1,221 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import re
+import gzip
+import json
+import hashlib
+import mimetypes
+import posixpath
+import click
+from flask import request, current_app, send_from_directory
+from flask.cli import AppGroup
+from templating import warm_templates
+
+#----------------------------------------------------------------------------#
+# Static assets.
+#----------------------------------------------------------------------------#
+
+# `flask assets build` copies every static file to ASSETS_DIR under a name
+# carrying a hash of its content, next to gzip and brotli variants, and
+# writes a manifest of the names. With a manifest, url_for('static', ...)
+# links the hashed copies, which never change and are served as immutable.
+
+MANIFEST = 'manifest.json'
+# worth compressing; images and woff fonts already are
+COMPRESSIBLE = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.eot', '.otf', '.ttf')
+MIN_COMPRESS_SIZE = 256
+# preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+CSS_URL = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+
+assets_cli = AppGroup(
+    'assets', help='Fingerprinted static files and compiled templates.')
+
+
+def fingerprint(name, data):
+    # css/main.css -> css/main.3f2a9c41d07b.css
+    root, ext = posixpath.splitext(name)
+    return '{}.{}{}'.format(root, hashlib.sha256(data).hexdigest()[:12], ext)
+
+
+def rewrite_css(name, text, manifest):
+    # relative url()s in a stylesheet point at the hashed copies, so a font
+    # or image change also changes the stylesheet's hash
+    directory = posixpath.dirname(name)
+
+    def replace(match):
+        quote, url = match.groups()
+        if url.startswith(('/', '#', 'data:')) or '://' in url:
+            return match.group(0)
+        path, suffix = re.match(r'([^?#]*)(.*)', url).groups()
+        target = manifest.get(posixpath.normpath(posixpath.join(directory, path)))
+        if target is None:
+            return match.group(0)
+        return 'url({0}{1}{2}{0})'.format(
+            quote, posixpath.relpath(target, directory or '.'), suffix)
+
+    return CSS_URL.sub(replace, text)
+
+
+def brotli_module():
+    # brotli is in requirements.txt; without it only gzip variants are built
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def brotli_compress(data):
+    brotli = brotli_module()
+    if brotli is None:
+        return None
+    return brotli.compress(data, quality=11)
+
+
+def compressed_variants(data):
+    variants = {'gzip': gzip.compress(data, 9, mtime=0)}
+    encoded = brotli_compress(data)
+    if encoded is not None:
+        variants['br'] = encoded
+    # a variant that saves nothing is not worth a Content-Encoding
+    return {encoding: encoded for encoding, encoded in variants.items()
+            if len(encoded) < len(data)}
+
+
+def static_names(static_folder, output):
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = [d for d in dirs if not d.startswith('.')
+                   and os.path.join(root, d) != output]
+        for name in files:
+            if not name.startswith('.'):
+                path = os.path.relpath(os.path.join(root, name), static_folder)
+                yield path.replace(os.sep, '/')
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(path + '.tmp', path)
+
+
+def build_assets(static_folder, output):
+    # files of earlier builds are kept: pages rendered before a deploy may
+    # still link them
+    output = os.path.abspath(output)
+    manifest = {'assets': {}, 'encodings': {}}
+    # stylesheets last, once the files they link have their hashed names
+    names = sorted(static_names(static_folder, output),
+                   key=lambda name: (name.endswith('.css'), name))
+    for name in names:
+        with open(os.path.join(static_folder, name), 'rb') as f:
+            data = f.read()
+        if name.endswith('.css'):
+            data = rewrite_css(
+                name, data.decode('utf-8'), manifest['assets']).encode('utf-8')
+        hashed = fingerprint(name, data)
+        manifest['assets'][name] = hashed
+        write_file(os.path.join(output, hashed), data)
+        if name.endswith(COMPRESSIBLE) and len(data) >= MIN_COMPRESS_SIZE:
+            variants = compressed_variants(data)
+            for encoding, suffix in ENCODINGS:
+                if encoding in variants:
+                    write_file(os.path.join(output, hashed + suffix), variants[encoding])
+            manifest['encodings'][hashed] = [
+                encoding for encoding, _ in ENCODINGS if encoding in variants]
+    write_file(os.path.join(output, MANIFEST),
+               json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+    return manifest
+
+
+class Assets:
+    # the manifest of the last build, loaded once per worker
+
+    def __init__(self):
+        self.directory = None
+        self.assets = {}
+        self.encodings = {}
+        self.hashed = set()
+
+    def load(self, directory):
+        self.directory = directory
+        try:
+            with open(os.path.join(directory, MANIFEST)) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        self.assets = manifest.get('assets', {})
+        self.encodings = manifest.get('encodings', {})
+        self.hashed = set(self.assets.values())
+
+    def url_name(self, filename):
+        hashed = self.assets.get(filename)
+        return 'build/' + hashed if hashed is not None else filename
+
+    def send(self, filename):
+        # the best precompressed variant the client accepts, else the
+        # hashed file itself
+        name = filename[len('build/'):]
+        path, encoding = name, None
+        for candidate, suffix in ENCODINGS:
+            if (candidate in self.encodings.get(name, ())
+                    and request.accept_encodings[candidate]):
+                path, encoding = name + suffix, candidate
+                break
+        response = send_from_directory(
+            self.directory, path, mimetype=mimetypes.guess_type(name)[0],
+            conditional=True)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+
+assets = Assets()
+
+
+def setup_assets(app):
+    # ASSETS_DIR is served as /static/build/; without a manifest there, as
+    # in development, static urls and responses are left as they are
+    assets.load(app.config.get(
+        'ASSETS_DIR', os.path.join(app.static_folder, 'build')))
+    send_static_file = app.view_functions['static']
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = assets.url_name(values['filename'])
+
+    def static(filename):
+        if filename.startswith('build/') and filename[len('build/'):] in assets.hashed:
+            return assets.send(filename)
+        return send_static_file(filename=filename)
+
+    app.view_functions['static'] = static
+
+
+@assets_cli.command('build')
+def build():
+    """Fingerprint and precompress the static files into ASSETS_DIR and
+    compile the templates into TEMPLATE_CACHE_DIR."""
+    output = current_app.config.get(
+        'ASSETS_DIR', os.path.join(current_app.static_folder, 'build'))
+    manifest = build_assets(current_app.static_folder, output)
+    assets.load(output)
+    click.echo('Built {} assets ({} precompressed) in {}.'.format(
+        len(manifest['assets']), len(manifest['encodings']), output))
+    if brotli_module() is None:
+        click.secho('Warning: the Brotli package is not installed, so no brotli '
+                    'variants were built (pip install -r requirements.txt).',
+                    fg='yellow', err=True)
+    if current_app.jinja_env.bytecode_cache is not None:
+        click.echo('Compiled {} templates into {}.'.format(
+            len(warm_templates(current_app.jinja_env)),
+            current_app.config['TEMPLATE_CACHE_DIR']))
@@ -0,0 +1,93 @@
+#----------------------------------------------------------------------------#
+# Benchmark: worker cold start, from a fresh process to its first rendered
+# pages, without and with the template bytecode cache and warm-up.
+#
+#   python bench/bench_cold_start.py [runs]
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 10
+# what a new worker renders first: the pages that need no database
+FIRST_PAGES = ('pages/home.html', 'forms/new_venue.html',
+               'forms/new_artist.html', 'forms/new_show.html',
+               'errors/404.html')
+
+
+def child():
+    # one cold worker: import the app (boot, warm-up included) then render
+    # the first pages, as its first requests would
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    from flask import render_template
+    from app import app
+    from forms import VenueForm, ArtistForm, ShowForm
+    booted = time.perf_counter()
+
+    forms = {'forms/new_venue.html': VenueForm, 'forms/new_artist.html': ArtistForm,
+             'forms/new_show.html': ShowForm}
+    with app.test_request_context('/'):
+        for name in FIRST_PAGES:
+            context = {'form': forms[name]()} if name in forms else {}
+            render_template(name, **context)
+    rendered = time.perf_counter()
+    print(json.dumps({'boot': booted - started, 'first_pages': rendered - booted}))
+
+
+def run(cache_dir, warmup):
+    env = dict(os.environ, FYYUR_TEMPLATE_CACHE_DIR=cache_dir,
+               FYYUR_TEMPLATE_WARMUP='1' if warmup else '0')
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child'], env=env,
+        check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings['process'] = time.perf_counter() - started
+    return timings
+
+
+def measure(runs, cache_dir, warmup, fresh_cache):
+    timings = []
+    for _ in range(runs):
+        if fresh_cache:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        timings.append(run(cache_dir, warmup))
+    return {key: statistics.median(t[key] for t in timings) for key in timings[0]}
+
+
+def main(runs):
+    cache_dir = tempfile.mkdtemp(prefix='fyyur-templates-')
+    try:
+        cases = [
+            ('no bytecode cache, lazy', '', False, False),
+            ('no bytecode cache, warm-up', '', True, False),
+            ('empty bytecode cache, warm-up', cache_dir, True, True),
+            ('filled bytecode cache, lazy', cache_dir, False, False),
+            ('filled bytecode cache, warm-up', cache_dir, True, False),
+        ]
+        # the "empty" runs leave the cache filled for the cases after them
+        print('runs: {} (medians, ms)'.format(runs))
+        print('{:32} {:>8} {:>12} {:>10} {:>9}'.format(
+            '', 'boot', 'first pages', 'to pages', 'process'))
+        for label, directory, warmup, fresh_cache in cases:
+            t = measure(runs, directory, warmup, fresh_cache)
+            print('{:32} {:8.1f} {:12.1f} {:10.1f} {:9.1f}'.format(
+                label, t['boot'] * 1000, t['first_pages'] * 1000,
+                (t['boot'] + t['first_pages']) * 1000, t['process'] * 1000))
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['--child']:
+        child()
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else RUNS)
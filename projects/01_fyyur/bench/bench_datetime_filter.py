@@ -0,0 +1,65 @@
+#----------------------------------------------------------------------------#
+# Benchmark: the `datetime` template filter against the previous
+# dateutil + babel.dates.format_datetime implementation.
+#
+#   python bench/bench_datetime_filter.py [rows]
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import babel.dates  # noqa: E402
+import dateutil.parser  # noqa: E402
+from filters import format_datetime, cached_format_datetime  # noqa: E402
+
+ROWS = 500
+REPEAT = 5
+
+
+def legacy_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def best(function, values):
+    def run():
+        for value in values:
+            function(value, 'full')
+    return min(timeit.repeat(run, number=1, repeat=REPEAT)) / len(values)
+
+
+def main(rows):
+    start = datetime(2021, 1, 3, 10, 38, 51, tzinfo=timezone.utc)
+    # a page of shows: a few distinct times repeated, as on venue pages
+    typed = [start + timedelta(days=i % 50) for i in range(rows)]
+    strings = [value.strftime('%Y-%m-%d %H:%M:%S') for value in typed]
+    unique = [start + timedelta(minutes=i) for i in range(rows)]
+
+    assert format_datetime(strings[0], 'full') == legacy_format_datetime(strings[0], 'full')
+
+    results = [
+        ('legacy, string', best(legacy_format_datetime, strings)),
+        ('filter, string', best(format_datetime, strings)),
+        ('filter, typed', best(format_datetime, typed)),
+    ]
+    cached_format_datetime.cache_clear()
+    results.append(('filter, typed, no repeats', best(
+        lambda value, format: cached_format_datetime.__wrapped__(
+            value, value.utcoffset(), format, babel.dates.LC_TIME), unique)))
+
+    print('{:<28} {:>12} {:>10}'.format('path', 'per row', 'speedup'))
+    for name, elapsed in results:
+        print('{:<28} {:>10.2f}us {:>9.1f}x'.format(
+            name, elapsed * 1e6, results[0][1] / elapsed))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS)
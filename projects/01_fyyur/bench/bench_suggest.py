@@ -0,0 +1,70 @@
+#----------------------------------------------------------------------------#
+# Benchmark: memory and lookup latency of the type-ahead prefix index.
+#
+#   python bench/bench_suggest.py [names]
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import time
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suggest import PrefixIndex  # noqa: E402
+
+NAMES = 100000
+LOOKUPS = 20000
+WORDS = [
+    'the', 'musical', 'hop', 'dueling', 'pianos', 'bar', 'park', 'square',
+    'live', 'music', 'coffee', 'guns', 'petals', 'wild', 'sax', 'band',
+    'blue', 'note', 'lounge', 'hall', 'club', 'garden', 'room', 'stage',
+    'jazz', 'rock', 'soul', 'house', 'theatre', 'arena', 'cellar', 'loft'
+]
+
+
+def synthetic_names(count):
+    random.seed(count)
+    for i in range(count):
+        words = random.sample(WORDS, random.randint(2, 4))
+        yield 'venue' if i % 2 else 'artist', i, '{} {}'.format(
+            ' '.join(words).title(), i)
+
+
+def main(count):
+    records = list(synthetic_names(count))
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = PrefixIndex()
+    index.build(records)
+    build_time = time.perf_counter() - started
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    prefixes = [name[:random.randint(1, 8)] for _, _, name in
+                random.sample(records, min(LOOKUPS, count))]
+    started = time.perf_counter()
+    for prefix in prefixes:
+        index.suggest(prefix)
+    lookup_time = (time.perf_counter() - started) / len(prefixes)
+
+    started = time.perf_counter()
+    for kind, id, name in records[:1000]:
+        index.add(kind, id, name + ' renamed')
+    update_time = (time.perf_counter() - started) / 1000
+
+    per_100k = 100000 / count
+    print('names:                 {}'.format(count))
+    print('build:                 {:.2f} s'.format(build_time))
+    print('memory (traced):       {:.1f} MiB per 100k names'.format(
+        traced * per_100k / 2 ** 20))
+    print('memory (footprint):    {:.1f} MiB per 100k names'.format(
+        index.memory_footprint() * per_100k / 2 ** 20))
+    print('suggest:               {:.1f} us'.format(lookup_time * 1e6))
+    print('add / rename:          {:.1f} us'.format(update_time * 1e6))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else NAMES)
@@ -0,0 +1,96 @@
+#----------------------------------------------------------------------------#
+# Benchmark: /venues render time against the number of venues.
+#
+# Needs a throw-away postgresql database, the tables are truncated:
+#   createdb fyyur_bench
+#   FYYUR_BENCH_DATABASE_URI=postgres://localhost:5432/fyyur_bench \
+#       python bench/bench_venues.py 1000 10000 100000 500000
+#----------------------------------------------------------------------------#
+
+import os
+import sys
+import time
+import random
+from itertools import islice
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app  # noqa: E402
+from models import db, Venue, Artist, Show  # noqa: E402
+from stats import refresh_venue_stats  # noqa: E402
+from synthetic import generate_shows, busiest_slot  # noqa: E402
+
+DATABASE_URI = os.environ.get(
+    'FYYUR_BENCH_DATABASE_URI',
+    'postgres://localhost:5432/fyyur_bench')
+SIZES = [1000, 10000, 100000, 500000]
+AREAS = 500
+SHOWS_PER_VENUE = 2
+# shows from 15 years back to 15 years ahead
+SHOW_YEARS = 15
+REPEAT = 3
+CHUNK = 10000
+
+
+def seed(count):
+    db.session.execute('TRUNCATE shows, artists, venues RESTART IDENTITY CASCADE')
+    rng = random.Random(count)
+    first_day = date.today() - timedelta(days=365 * SHOW_YEARS)
+    days = 2 * 365 * SHOW_YEARS
+    shows = count * SHOWS_PER_VENUE
+    # as many artists as the busiest slot has shows, so no artist is booked
+    # twice at once
+    artists = max(busiest_slot(shows, first_day, days), 1)
+    db.session.execute(Artist.__table__.insert(), [{
+        'name': 'Bench Artist {}'.format(i),
+        'city': 'Bench City',
+        'state': 'CA',
+        'genres': ['Jazz'],
+        'seeking_venue': False
+    } for i in range(artists)])
+    for start in range(0, count, CHUNK):
+        db.session.execute(Venue.__table__.insert(), [{
+            'name': 'Venue {}'.format(i),
+            'city': 'City {}'.format(i % AREAS),
+            'state': 'CA',
+            'genres': ['Jazz'],
+            'seeking_talent': False
+        } for i in range(start, min(start + CHUNK, count))])
+    records = generate_shows(range(1, count + 1), range(1, artists + 1),
+                             shows, first_day, days, rng)
+    while True:
+        chunk = list(islice(records, CHUNK))
+        if not chunk:
+            break
+        db.session.execute(Show.__table__.insert(), chunk)
+    db.session.commit()
+    refresh_venue_stats(concurrently=False)
+    db.session.execute('ANALYZE')
+
+
+def render(client):
+    started = time.perf_counter()
+    response = client.get('/venues')
+    size = len(response.get_data())
+    return time.perf_counter() - started, size
+
+
+def main(sizes):
+    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URI
+    app.config['DEBUG'] = False
+    client = app.test_client()
+
+    print('{:>10} {:>12} {:>12} {:>14}'.format(
+        'venues', 'best (s)', 'per venue', 'bytes'))
+    for count in sizes:
+        with app.app_context():
+            seed(count)
+        timings = [render(client) for _ in range(REPEAT)]
+        best = min(elapsed for elapsed, _ in timings)
+        print('{:>10} {:>12.4f} {:>10.2f}us {:>14}'.format(
+            count, best, best / count * 1e6, timings[0][1]))
+
+
+if __name__ == '__main__':
+    main([int(x) for x in sys.argv[1:]] or SIZES)
@@ -0,0 +1,540 @@
+#----------------------------------------------------------------------------#
+# Load test: concurrent virtual users exercising every route of app.py,
+# reporting throughput and p50/p95/p99 latency per route.
+#
+# Against a running server with a generated catalog:
+#   FLASK_APP=app flask catalog generate --shows 1000000
+#   gunicorn -w 4 app:app
+#   python bench/loadtest.py http://localhost:8000 --users 50 --duration 60
+#
+# Keep a baseline and fail (exit 1) when a route's p95 regresses:
+#   python bench/loadtest.py http://localhost:8000 --save baseline.json
+#   python bench/loadtest.py http://localhost:8000 --compare baseline.json
+#
+# Only the standard library is needed, the client speaks HTTP/1.1 over
+# asyncio streams with one keep-alive connection per user.
+#----------------------------------------------------------------------------#
+
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlsplit, urlencode
+
+USERS = 20
+DURATION = 60
+WARMUP = 5
+# a route regresses when its p95 grows by this share and by NOISE_MS
+TOLERANCE = 0.2
+NOISE_MS = 5
+# feed pages read at start to find venues, artists and show times
+DISCOVERY_PAGES = 10
+
+SEARCH_WORDS = ('the', 'blue', 'hall', 'club', 'wild', 'jazz', 'band', 'lounge',
+                'electric', 'velvet', 'saints', 'garden', 'music', 'rock')
+GENRES = ('Jazz', 'Rock n Roll', 'Pop', 'Hip-Hop', 'Blues', 'Folk', 'Soul')
+CSRF_TOKEN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+VERSION = re.compile(r'name="version"[^>]*value="(\d+)"')
+VENUE_LINK = re.compile(r'/venues/(\d+)')
+
+
+#----------------------------------------------------------------------------#
+# HTTP client.
+#----------------------------------------------------------------------------#
+
+class Response:
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self):
+        return self.body.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class Client:
+    # one keep-alive connection and a cookie jar, like a browser tab
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == 'https' else 80)
+        self.ssl = url.scheme == 'https'
+        self.prefix = url.path.rstrip('/')
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def request(self, method, path, form=None, headers=None):
+        body = urlencode(form, doseq=True).encode() if form is not None else b''
+        lines = ['{} {}{} HTTP/1.1'.format(method, self.prefix, path),
+                 'Host: {}:{}'.format(self.host, self.port),
+                 'Accept-Encoding: identity',
+                 'Content-Length: {}'.format(len(body))]
+        if form is not None:
+            lines.append('Content-Type: application/x-www-form-urlencoded')
+        if self.cookies:
+            lines.append('Cookie: ' + '; '.join(
+                '{}={}'.format(k, v) for k, v in self.cookies.items()))
+        lines.extend('{}: {}'.format(k, v) for k, v in (headers or {}).items())
+        payload = ('\r\n'.join(lines) + '\r\n\r\n').encode() + body
+
+        for attempt in (1, 2):
+            # a kept-alive connection the server closed is retried once
+            reused = self.writer is not None
+            if not reused:
+                self.reader, self.writer = await asyncio.open_connection(
+                    self.host, self.port, ssl=self.ssl)
+            try:
+                self.writer.write(payload)
+                await self.writer.drain()
+                return await self.read_response(method)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                await self.close()
+                if not reused or attempt == 2:
+                    raise
+
+    async def read_response(self, method):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                cookie, _, _ = value.partition(';')
+                key, _, cookie_value = cookie.partition('=')
+                self.cookies[key.strip()] = cookie_value.strip()
+            headers[name] = value
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await self.reader.readline()) not in (b'\r\n', b''):
+                        pass
+                    break
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            body = await self.reader.read()
+            headers['connection'] = 'close'
+
+        if headers.get('connection', '').lower() == 'close' or status_line.startswith(b'HTTP/1.0'):
+            await self.close()
+        return Response(status, headers, body)
+
+
+#----------------------------------------------------------------------------#
+# Scenarios.
+#----------------------------------------------------------------------------#
+
+class User:
+    # a virtual user: its client, what it has learned of the catalog and
+    # the venues it created (the only ones it deletes)
+
+    def __init__(self, client, catalog, stats, rng):
+        self.client = client
+        self.catalog = catalog
+        self.stats = stats
+        self.rng = rng
+        self.created_venues = []
+        self.etags = {}
+
+    async def call(self, route, method, path, form=None, headers=None):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, form, headers)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            self.stats.record(route, None, time.perf_counter() - started)
+            raise
+        self.stats.record(route, response.status, time.perf_counter() - started)
+        return response
+
+    def venue_id(self):
+        return self.rng.choice(self.catalog['venue_ids'])
+
+    def artist_id(self):
+        return self.rng.choice(self.catalog['artist_ids'])
+
+    def word(self):
+        return self.rng.choice(SEARCH_WORDS)
+
+    async def csrf_form(self, route, path):
+        page = await self.call(route, 'GET', path)
+        match = CSRF_TOKEN.search(page.text())
+        return page, ({'csrf_token': match.group(1)} if match else {})
+
+    def venue_form(self, name):
+        return {
+            'name': name,
+            'city': 'San Francisco',
+            'state': 'CA',
+            'address': '1015 Folsom Street',
+            'phone': '415-555-{:04d}'.format(self.rng.randint(0, 9999)),
+            'genres': [self.rng.choice(GENRES)],
+            'facebook_link': 'https://www.facebook.com/loadtest'
+        }
+
+    # reads
+
+    async def index(self):
+        await self.call('index', 'GET', '/')
+
+    async def search(self):
+        await self.call('search', 'GET', '/search?' + urlencode({'q': self.word()}))
+
+    async def search_suggest(self):
+        await self.call('search_suggest', 'GET', '/search/suggest?' + urlencode(
+            {'q': self.word()[:self.rng.randint(1, 4)]}))
+
+    async def cache_stats(self):
+        await self.call('cache_stats', 'GET', '/cache/stats')
+
+    async def metrics_page(self):
+        await self.call('metrics_page', 'GET', '/metrics')
+
+    async def venues(self):
+        query = '?' + urlencode({'genre': self.rng.choice(GENRES)}) if self.rng.random() < 0.5 else ''
+        await self.call('venues', 'GET', '/venues' + query)
+
+    async def search_venues(self):
+        await self.call('search_venues', 'POST', '/venues/search',
+                        {'search_term': self.word()})
+
+    async def show_venue(self):
+        await self.call('show_venue', 'GET', '/venues/{}'.format(self.venue_id()))
+
+    async def venue_availability_feed(self):
+        await self.call('venue_availability_feed', 'GET',
+                        '/venues/{}/availability?days=7'.format(self.venue_id()))
+
+    async def artists(self):
+        await self.call('artists', 'GET', '/artists')
+
+    async def genres_facets(self):
+        await self.call('genres_facets', 'GET', '/genres/facets?' + urlencode(
+            {'kind': self.rng.choice(('venues', 'artists')),
+             'genre': self.rng.choice(GENRES)}))
+
+    async def search_artists(self):
+        await self.call('search_artists', 'POST', '/artists/search',
+                        {'search_term': self.word()})
+
+    async def show_artist(self):
+        await self.call('show_artist', 'GET', '/artists/{}'.format(self.artist_id()))
+
+    async def shows(self):
+        await self.call('shows', 'GET', '/shows?' + urlencode(
+            {'start': self.rng.choice(self.catalog['show_times'])}))
+
+    async def shows_feed(self):
+        await self.call('shows_feed', 'GET', '/shows/feed?' + urlencode(
+            {'venue_id': self.venue_id()}))
+
+    async def export(self):
+        # incremental exports; a full one is a bulk job, not a request
+        since = (datetime.now(timezone.utc) - timedelta(minutes=10)).isoformat()
+        await self.call('export', 'GET', '/export/{}?'.format(
+            self.rng.choice(('venues', 'artists', 'shows'))) + urlencode({'since': since}))
+
+    async def create_venue_form(self):
+        await self.call('create_venue_form', 'GET', '/venues/create')
+
+    async def create_artist_form(self):
+        await self.call('create_artist_form', 'GET', '/artists/create')
+
+    async def create_shows(self):
+        await self.call('create_shows', 'GET', '/shows/create')
+
+    async def edit_artist(self):
+        await self.call('edit_artist', 'GET', '/artists/{}/edit'.format(self.artist_id()))
+
+    async def edit_venue(self):
+        await self.call('edit_venue', 'GET', '/venues/{}/edit'.format(self.venue_id()))
+
+    async def api(self):
+        # revalidates what it has seen before, as the mobile client does
+        kind = self.rng.choice(('venues', 'venue', 'artists', 'artist', 'shows'))
+        path = {
+            'venues': '/api/v1/venues',
+            'venue': '/api/v1/venues/{}'.format(self.venue_id()),
+            'artists': '/api/v1/artists',
+            'artist': '/api/v1/artists/{}'.format(self.artist_id()),
+            'shows': '/api/v1/shows?' + urlencode({'artist_id': self.artist_id()})
+        }[kind]
+        headers = {'If-None-Match': self.etags[path]} if path in self.etags else None
+        response = await self.call('api.' + kind, 'GET', path, headers=headers)
+        if 'etag' in response.headers:
+            self.etags[path] = response.headers['etag']
+
+    # writes
+
+    async def create_venue_submission(self):
+        name = 'Loadtest Venue {}'.format(self.rng.getrandbits(48))
+        _, form = await self.csrf_form('create_venue_form', '/venues/create')
+        form.update(self.venue_form(name))
+        await self.call('create_venue_submission', 'POST', '/venues/create', form)
+        found = await self.call('search_venues', 'POST', '/venues/search',
+                                {'search_term': name})
+        self.created_venues.extend(int(id) for id in VENUE_LINK.findall(found.text()))
+
+    async def create_artist_submission(self):
+        _, form = await self.csrf_form('create_artist_form', '/artists/create')
+        form.update(self.venue_form('Loadtest Artist {}'.format(self.rng.getrandbits(48))))
+        form.pop('address')
+        await self.call('create_artist_submission', 'POST', '/artists/create', form)
+
+    async def create_show_submission(self):
+        # mostly free slots far ahead; a booking conflict answers 409
+        start = datetime.now(timezone.utc) + timedelta(
+            days=self.rng.randint(400, 700), hours=self.rng.randint(0, 23))
+        await self.call('create_show_submission', 'POST', '/shows/create', {
+            'venue_id': self.venue_id(),
+            'artist_id': self.artist_id(),
+            'start_time': start.strftime('%Y-%m-%d %H:%M:%S'),
+            'duration': 90
+        })
+
+    async def edit_venue_submission(self):
+        venue_id = self.venue_id()
+        page, form = await self.csrf_form('edit_venue', '/venues/{}/edit'.format(venue_id))
+        version = VERSION.search(page.text())
+        if page.status != 200 or version is None:
+            return
+        form.update(self.venue_form('Loadtest Venue {}'.format(venue_id)))
+        form['version'] = version.group(1)
+        await self.call('edit_venue_submission', 'POST',
+                        '/venues/{}/edit'.format(venue_id), form)
+
+    async def edit_artist_submission(self):
+        artist_id = self.artist_id()
+        page, form = await self.csrf_form('edit_artist', '/artists/{}/edit'.format(artist_id))
+        version = VERSION.search(page.text())
+        if page.status != 200 or version is None:
+            return
+        form.update(self.venue_form('Loadtest Artist {}'.format(artist_id)))
+        form.pop('address')
+        form['version'] = version.group(1)
+        await self.call('edit_artist_submission', 'POST',
+                        '/artists/{}/edit'.format(artist_id), form)
+
+    async def delete_venue(self):
+        if not self.created_venues:
+            return await self.create_venue_submission()
+        await self.call('delete_venue', 'DELETE',
+                        '/venues/{}'.format(self.created_venues.pop()))
+
+
+# (scenario, weight); the mix of a browsing audience with a few editors
+READS = (
+    ('index', 3), ('search', 4), ('search_suggest', 6), ('cache_stats', 0.5),
+    ('metrics_page', 0.5), ('venues', 1), ('search_venues', 3),
+    ('show_venue', 10), ('venue_availability_feed', 3), ('artists', 1),
+    ('genres_facets', 2), ('search_artists', 3), ('show_artist', 10),
+    ('shows', 5), ('shows_feed', 5), ('export', 0.5), ('api', 8),
+    ('create_venue_form', 1), ('create_artist_form', 1), ('create_shows', 1),
+    ('edit_artist', 1), ('edit_venue', 1))
+WRITES = (
+    ('create_venue_submission', 0.5), ('create_artist_submission', 0.5),
+    ('create_show_submission', 1), ('edit_venue_submission', 0.5),
+    ('edit_artist_submission', 0.5), ('delete_venue', 0.3))
+
+
+#----------------------------------------------------------------------------#
+# Statistics.
+#----------------------------------------------------------------------------#
+
+def percentile(sorted_values, share):
+    # nearest rank
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1,
+                             max(0, int(round(share * len(sorted_values))) - 1))]
+
+
+class Stats:
+
+    def __init__(self):
+        self.recording = False
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def record(self, route, status, seconds):
+        if not self.recording:
+            return
+        self.latencies.setdefault(route, []).append(seconds)
+        key = status if status is not None else 'failed'
+        route_statuses = self.statuses.setdefault(route, {})
+        route_statuses[key] = route_statuses.get(key, 0) + 1
+        if status is None or status >= 500:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self, elapsed):
+        routes = {}
+        for route, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            routes[route] = {
+                'requests': len(latencies),
+                'errors': self.errors.get(route, 0),
+                'statuses': {str(k): v for k, v in sorted(
+                    self.statuses[route].items(), key=lambda item: str(item[0]))},
+                'rps': len(latencies) / elapsed,
+                'p50': percentile(latencies, 0.50) * 1000,
+                'p95': percentile(latencies, 0.95) * 1000,
+                'p99': percentile(latencies, 0.99) * 1000
+            }
+        return routes
+
+
+def report(routes, elapsed, baseline=None):
+    print('{:28} {:>8} {:>7} {:>8} {:>9} {:>9} {:>9}  {}'.format(
+        'route', 'requests', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', 'statuses'))
+    regressions = []
+    for route, r in routes.items():
+        flag = ''
+        if baseline and route in baseline:
+            before = baseline[route]['p95']
+            if r['p95'] > before * (1 + TOLERANCE) and r['p95'] - before > NOISE_MS:
+                flag = '  REGRESSED (p95 was {:.1f} ms)'.format(before)
+                regressions.append(route)
+        print('{:28} {:8d} {:7d} {:8.1f} {:9.1f} {:9.1f} {:9.1f}  {}{}'.format(
+            route, r['requests'], r['errors'], r['rps'], r['p50'], r['p95'],
+            r['p99'], ' '.join('{}:{}'.format(k, v) for k, v in r['statuses'].items()),
+            flag))
+    total = sum(r['requests'] for r in routes.values())
+    errors = sum(r['errors'] for r in routes.values())
+    print('total: {} requests in {:.1f}s, {:.1f} req/s, {} errors'.format(
+        total, elapsed, total / elapsed if elapsed else 0, errors))
+    return regressions
+
+
+#----------------------------------------------------------------------------#
+# Runner.
+#----------------------------------------------------------------------------#
+
+async def discover(base_url):
+    # venues, artists and start times from the upcoming show feed, in the
+    # proportions they are booked
+    client = Client(base_url)
+    catalog = {'venue_ids': set(), 'artist_ids': set(), 'show_times': []}
+    query = {'start': datetime.now(timezone.utc).isoformat(), 'limit': 100}
+    try:
+        for _ in range(DISCOVERY_PAGES):
+            page = (await client.request('GET', '/shows/feed?' + urlencode(query))).json()
+            for show in page['shows']:
+                catalog['venue_ids'].add(show['venue_id'])
+                catalog['artist_ids'].add(show['artist_id'])
+                catalog['show_times'].append(show['start_time'])
+            if page['next_cursor'] is None:
+                break
+            query['after'] = page['next_cursor']
+    finally:
+        await client.close()
+    if not catalog['show_times']:
+        sys.exit('no upcoming shows found; generate a catalog first '
+                 '(flask catalog generate)')
+    catalog['venue_ids'] = sorted(catalog['venue_ids'])
+    catalog['artist_ids'] = sorted(catalog['artist_ids'])
+    return catalog
+
+
+async def run_user(number, args, catalog, stats, deadline, scenarios, weights):
+    rng = random.Random(args.seed * 100003 + number)
+    client = Client(args.url)
+    user = User(client, catalog, stats, rng)
+    try:
+        while time.monotonic() < deadline:
+            scenario = rng.choices(scenarios, weights)[0]
+            try:
+                await getattr(user, scenario)()
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                await client.close()
+            if args.think:
+                await asyncio.sleep(rng.expovariate(1 / args.think))
+    finally:
+        await client.close()
+
+
+async def run(args):
+    catalog = await discover(args.url)
+    mix = READS + (() if args.read_only else WRITES)
+    scenarios = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    stats = Stats()
+
+    started = time.monotonic()
+    deadline = started + args.warmup + args.duration
+
+    async def start_recording():
+        await asyncio.sleep(args.warmup)
+        stats.recording = True
+
+    recorder = asyncio.ensure_future(start_recording())
+    await asyncio.gather(*[
+        run_user(number, args, catalog, stats, deadline, scenarios, weights)
+        for number in range(args.users)])
+    await recorder
+    elapsed = time.monotonic() - started - args.warmup
+    return stats.summary(elapsed), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Load test every route of the Fyyur app.')
+    parser.add_argument('url', nargs='?', default='http://localhost:5000')
+    parser.add_argument('--users', type=int, default=USERS)
+    parser.add_argument('--duration', type=float, default=DURATION,
+                        help='seconds measured, after the warm-up')
+    parser.add_argument('--warmup', type=float, default=WARMUP,
+                        help='seconds run before measuring')
+    parser.add_argument('--think', type=float, default=0,
+                        help='mean seconds a user waits between requests')
+    parser.add_argument('--read-only', action='store_true',
+                        help='skip the create, edit and delete routes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='write the per-route results as JSON')
+    parser.add_argument('--compare', help='flag routes whose p95 regressed '
+                        'against results saved with --save')
+    args = parser.parse_args()
+
+    routes, elapsed = asyncio.run(run(args))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['routes']
+    regressions = report(routes, elapsed, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'users': args.users, 'duration': args.duration,
+                       'routes': routes}, f, indent=1)
+    if regressions:
+        sys.exit('p95 regressed on: ' + ', '.join(regressions))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from flask import session
+from models import db, Show
+from routing import reading_own_writes
+
+#----------------------------------------------------------------------------#
+# Cache backends.
+#----------------------------------------------------------------------------#
+
+
+class LRUCache:
+    # bounded in-process cache, entries expire after their own ttl
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RedisCache:
+    # shared backend, so every worker sees the same pages and invalidations
+
+    def __init__(self, url, prefix='fyyur:page:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else value.decode('utf-8')
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value.encode('utf-8'),
+                        px=max(1, int(ttl * 1000)))
+
+    def delete_many(self, keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+
+# marks a page invalidated in the last replica_lag seconds
+INVALIDATED_PREFIX = 'invalidated:'
+
+
+class PageCache:
+    # rendered venue and artist pages: the in-process LRU in front of an
+    # optional shared backend. With a shared backend, local copies are only
+    # kept for local_ttl seconds so invalidations from other workers are seen.
+    # For replica_lag seconds after an invalidation, pages rendered from a
+    # replica (which may not have the write yet) are not cached
+
+    def __init__(self, max_entries=1024, ttl=300, local_ttl=5, shared=None,
+                 replica_lag=5):
+        self.local = LRUCache(max_entries)
+        self.ttl = ttl
+        self.local_ttl = local_ttl
+        self.shared = shared
+        self.replica_lag = replica_lag
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(
+            ('hits', 'local_hits', 'shared_hits', 'misses', 'sets',
+             'invalidations'), 0)
+
+    def configure(self, config):
+        self.local = LRUCache(config.get('PAGE_CACHE_SIZE', 1024))
+        self.ttl = config.get('PAGE_CACHE_TTL', 300)
+        self.local_ttl = config.get('PAGE_CACHE_LOCAL_TTL', 5)
+        url = config.get('PAGE_CACHE_REDIS_URL')
+        self.shared = RedisCache(url) if url else None
+        self.replica_lag = config.get('REPLICA_STICKY_SECONDS', 5)
+
+    def count(self, *names):
+        with self.lock:
+            for name in names:
+                self.counters[name] += 1
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self.count('hits', 'local_hits')
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value, self.local_ttl)
+                self.count('hits', 'shared_hits')
+                return value
+        self.count('misses')
+        return None
+
+    def recently_invalidated(self, key):
+        marker = INVALIDATED_PREFIX + key
+        return (self.local.get(marker) is not None or
+                (self.shared is not None and self.shared.get(marker) is not None))
+
+    def set(self, key, value, expires_at=None, from_replica=False):
+        # expires_at: the start of the next upcoming show on the page, after
+        # which the page would list a past show as upcoming
+        if from_replica and self.recently_invalidated(key):
+            return
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.now(timezone.utc)).total_seconds())
+        if ttl <= 0:
+            return
+        self.count('sets')
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+            ttl = min(ttl, self.local_ttl)
+        self.local.set(key, value, ttl)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        with self.lock:
+            self.counters['invalidations'] += len(keys)
+        self.local.delete_many(keys)
+        if self.shared is not None:
+            self.shared.delete_many(keys)
+        for key in keys:
+            self.local.set(INVALIDATED_PREFIX + key, '1', self.replica_lag)
+            if self.shared is not None:
+                self.shared.set(INVALIDATED_PREFIX + key, '1', self.replica_lag)
+
+    def clear(self):
+        self.local.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+        stats['entries'] = len(self.local)
+        stats['shared'] = self.shared is not None
+        return stats
+
+
+page_cache = PageCache()
+
+
+def page_key(kind, id):
+    # pages are only cached while no flashed message is waiting, since the
+    # layout renders (and consumes) the flashes, and not for a client reading
+    # its own writes from the primary: it would get a page rendered before
+    # them, or fill the cache for everyone else
+    if '_flashes' in session or reading_own_writes():
+        return None
+    return '{}:{}'.format(kind, id)
+
+
+def venue_page_keys(venue_id):
+    # the venue page and every artist page listing a show at the venue
+    artist_ids = db.session.query(Show.artist_id).filter(
+        Show.venue_id == venue_id).distinct()
+    return ['venue:{}'.format(venue_id)] + [
+        'artist:{}'.format(artist_id) for (artist_id,) in artist_ids]
+
+
+def artist_page_keys(artist_id):
+    # the artist page and every venue page listing a show of the artist
+    venue_ids = db.session.query(Show.venue_id).filter(
+        Show.artist_id == artist_id).distinct()
+    return ['artist:{}'.format(artist_id)] + [
+        'venue:{}'.format(venue_id) for (venue_id,) in venue_ids]
@@ -0,0 +1,399 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import io
+import csv
+import json
+import time
+import random
+import click
+from itertools import islice
+from datetime import datetime, date, timedelta
+from flask.cli import AppGroup
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError, DataError
+from werkzeug.datastructures import MultiDict
+from forms import VenueForm, ArtistForm, ShowForm
+from models import db, Venue, Artist, Show, without_statement_timeout
+from export import EXPORT_MODELS, EXPORT_MIMETYPES, export_lines
+from stats import refresh_venue_stats
+from partitions import create_show_partitions, archive_show_partitions, month_start
+from synthetic import generate_venues, generate_artists, generate_shows, busiest_slot
+
+#----------------------------------------------------------------------------#
+# Catalog commands.
+#----------------------------------------------------------------------------#
+
+catalog_cli = AppGroup(
+    'catalog', help='Bulk import and export of venues, artists and shows.')
+
+IMPORT_BATCH_SIZE = 5000
+
+VENUE_COLUMNS = (
+    'name', 'city', 'state', 'address', 'phone', 'genres', 'website',
+    'facebook_link', 'image_link', 'seeking_talent', 'seeking_description')
+ARTIST_COLUMNS = (
+    'name', 'city', 'state', 'phone', 'genres', 'website', 'facebook_link',
+    'image_link', 'seeking_venue', 'seeking_description')
+SHOW_COLUMNS = ('venue_id', 'artist_id', 'start_time', 'duration')
+
+
+#  Reading
+#  ----------------------------------------------------------------
+
+def read_rows(stream, format):
+    # yields (line number, row, error); csv genres are ';' separated
+    if format == 'ndjson':
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield number, {'line': line.rstrip('\n')}, str(e)
+                continue
+            yield number, row, None
+    else:
+        for number, row in enumerate(csv.DictReader(stream), 2):
+            if row.get('genres'):
+                row['genres'] = [x.strip() for x in row['genres'].split(';')]
+            yield number, row, None
+
+
+def form_data(row):
+    # present a row to the forms the way a browser would submit it
+    data = MultiDict()
+    for key, value in row.items():
+        if isinstance(value, list):
+            for item in value:
+                data.add(key, str(item))
+        elif isinstance(value, bool):
+            if value:
+                data.add(key, 'y')
+        elif value is not None:
+            data.add(key, str(value))
+    return data
+
+
+def validate(form_class, row, columns):
+    form = form_class(formdata=form_data(row), meta={'csrf': False})
+    if not form.validate():
+        return None, '; '.join(
+            '{}: {}'.format(name, ', '.join(errors))
+            for name, errors in form.errors.items())
+    # an empty optional field takes the form's default: COPY would write an
+    # explicit NULL rather than the column default
+    return {name: form[name].default if form[name].data is None else form[name].data
+            for name in columns}, None
+
+
+#  Reference resolution
+#  ----------------------------------------------------------------
+
+def existing_ids(model, ids):
+    if not ids:
+        return set()
+    return {id for (id,) in db.session.query(model.id).filter(model.id.in_(ids))}
+
+
+def ids_by_name(model, names):
+    # names that match exactly one record; duplicates are ambiguous
+    if not names:
+        return {}
+    rows = db.session.query(
+        model.name, func.min(model.id), func.count(model.id)).filter(
+        model.name.in_(names)).group_by(model.name)
+    return {name: id for name, id, count in rows if count == 1}
+
+
+def resolve_shows(batch):
+    # fill in venue_id / artist_id of a batch of (record, row, line number)
+    # from ids or names, with one lookup per referenced table
+    references = (
+        ('venue_id', 'venue_name', Venue),
+        ('artist_id', 'artist_name', Artist))
+    resolved = {}
+    for id_key, name_key, model in references:
+        ids = {int(record[id_key]) for record, row, _ in batch
+               if str(record[id_key] or '').isdigit()}
+        names = {row.get(name_key) for record, row, _ in batch
+                 if not record[id_key] and row.get(name_key)}
+        resolved[id_key] = (existing_ids(model, ids), ids_by_name(model, names))
+
+    for record, row, number in batch:
+        error = None
+        for id_key, name_key, model in references:
+            ids, names = resolved[id_key]
+            if str(record[id_key] or '').isdigit():
+                record[id_key] = int(record[id_key])
+                if record[id_key] not in ids:
+                    error = 'unknown {} {}'.format(id_key, record[id_key])
+            elif row.get(name_key) in names:
+                record[id_key] = names[row[name_key]]
+            else:
+                error = 'unknown or ambiguous {} {!r}'.format(
+                    name_key, row.get(name_key))
+        yield record, row, number, error
+
+
+#  Loading
+#  ----------------------------------------------------------------
+
+def pg_array(values):
+    return '{' + ','.join('"{}"'.format(
+        value.replace('\\', '\\\\').replace('"', '\\"'))
+        for value in values) + '}'
+
+
+def copy_value(value):
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, list):
+        return pg_array(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def constraint_errors():
+    # as SQLAlchemy raises them, and as the driver does for COPY
+    dbapi = db.engine.dialect.dbapi
+    return (IntegrityError, DataError, dbapi.IntegrityError, dbapi.DataError)
+
+
+def error_message(error):
+    return str(getattr(error, 'orig', error)).strip().splitlines()[0]
+
+
+def load(table, columns, records):
+    # postgresql: one COPY per batch; other databases: one executemany. A
+    # batch the database rejects (an overlapping show, a bad value) is
+    # retried row by row; returns (position, error) of the records that fail
+    errors = constraint_errors()
+    try:
+        if db.engine.dialect.name == 'postgresql':
+            without_statement_timeout()
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for record in records:
+                writer.writerow([copy_value(record[name]) for name in columns])
+            buffer.seek(0)
+            cursor = db.session.connection().connection.cursor()
+            cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                table.name, ', '.join(columns)), buffer)
+        else:
+            db.session.execute(table.insert(), records)
+        db.session.commit()
+        return []
+    except errors:
+        db.session.rollback()
+
+    failed = []
+    for position, record in enumerate(records):
+        try:
+            db.session.execute(table.insert(), record)
+            db.session.commit()
+        except errors as e:
+            db.session.rollback()
+            failed.append((position, error_message(e)))
+    return failed
+
+
+#  Import command
+#  ----------------------------------------------------------------
+
+IMPORTS = {
+    'venues': (VenueForm, Venue, VENUE_COLUMNS),
+    'artists': (ArtistForm, Artist, ARTIST_COLUMNS),
+    'shows': (ShowForm, Show, SHOW_COLUMNS)
+}
+
+
+@catalog_cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTS)))
+@click.argument('source', type=click.File('r'))
+@click.option('--format', 'format', type=click.Choice(['csv', 'ndjson']),
+              help='Input format, guessed from the file name by default.')
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+@click.option('--rejects', type=click.File('w'),
+              help='Write rejected rows with their errors as NDJSON.')
+def import_catalog(kind, source, format, batch_size, rejects):
+    """Stream venues, artists or shows from CSV or NDJSON into the db."""
+    form_class, model, columns = IMPORTS[kind]
+    if format is None:
+        format = 'ndjson' if source.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+    loaded = rejected = 0
+    started = time.perf_counter()
+
+    def reject(number, row, error):
+        nonlocal rejected
+        rejected += 1
+        if rejects is not None:
+            rejects.write(json.dumps(
+                {'line': number, 'error': error, 'row': row}, default=str) + '\n')
+
+    def flush(batch):
+        nonlocal loaded
+        records = []
+        if kind == 'shows':
+            for record, row, number, error in resolve_shows(batch):
+                if error:
+                    reject(number, row, error)
+                else:
+                    records.append((record, row, number))
+        else:
+            records = batch
+        failed = []
+        if records:
+            failed = load(model.__table__, columns,
+                          [record for record, _, _ in records])
+        for position, error in failed:
+            _, row, number = records[position]
+            reject(number, row, error)
+        loaded += len(records) - len(failed)
+        elapsed = time.perf_counter() - started
+        click.echo('{}: {} loaded, {} rejected, {:.0f} rows/s'.format(
+            kind, loaded, rejected, (loaded + rejected) / elapsed), err=True)
+
+    batch = []
+    for number, row, error in read_rows(source, format):
+        if error is None:
+            record, error = validate(form_class, row, columns)
+        if error is not None:
+            reject(number, row, error)
+            continue
+        batch.append((record, row, number))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    flush(batch)
+
+    elapsed = time.perf_counter() - started
+    click.echo('Imported {} {} in {:.1f}s ({:.0f} rows/s), {} rejected.'.format(
+        loaded, kind, elapsed, (loaded + rejected) / elapsed if elapsed else 0,
+        rejected))
+
+
+#  Export command
+#  ----------------------------------------------------------------
+
+@catalog_cli.command('export')
+@click.argument('kind', type=click.Choice(sorted(EXPORT_MODELS)))
+@click.option('--format', 'format', type=click.Choice(sorted(EXPORT_MIMETYPES)),
+              default='ndjson', show_default=True)
+@click.option('--since', type=datetime.fromisoformat,
+              help='Only rows updated at or after this ISO timestamp.')
+@click.option('-o', '--output', type=click.File('w'), default='-')
+def export_catalog(kind, format, since, output):
+    """Stream venues, artists or shows as CSV or NDJSON."""
+    for chunk in export_lines(kind, format, since):
+        output.write(chunk)
+
+
+#  Statistics
+#  ----------------------------------------------------------------
+
+@catalog_cli.command('refresh-stats')
+@click.option('--blocking', is_flag=True,
+              help='Refresh without CONCURRENTLY (faster, blocks readers).')
+def refresh_stats(blocking):
+    """Refresh the venue_stats materialized view."""
+    started = time.perf_counter()
+    refresh_venue_stats(concurrently=not blocking)
+    click.echo('Refreshed venue_stats in {:.1f}s.'.format(
+        time.perf_counter() - started))
+
+
+#  Show partitions
+#  ----------------------------------------------------------------
+
+@catalog_cli.command('create-partitions')
+@click.option('--months', default=12, show_default=True,
+              help='Months ahead of the current one to create.')
+def create_partitions(months):
+    """Create the monthly shows partitions for the coming months."""
+    for name in create_show_partitions(date.today(), months + 1):
+        click.echo(name)
+
+
+@catalog_cli.command('archive-shows')
+@click.option('--keep', default=24, show_default=True,
+              help='Months of past shows to keep attached.')
+@click.option('--drop', is_flag=True,
+              help='Drop old partitions instead of moving them to the archive schema.')
+def archive_shows(keep, drop):
+    """Detach the partitions of shows older than --keep months."""
+    archived = archive_show_partitions(month_start(date.today(), -keep), drop)
+    click.echo('{} {} partitions: {}'.format(
+        'Dropped' if drop else 'Archived', len(archived),
+        ', '.join(archived) or '-'))
+
+
+#  Synthetic data
+#  ----------------------------------------------------------------
+
+def load_generated(model, columns, records, batch_size):
+    loaded = 0
+    started = time.perf_counter()
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        loaded += len(batch) - len(load(model.__table__, columns, batch))
+        click.echo('{}: {} loaded, {:.0f} rows/s'.format(
+            model.__tablename__, loaded, loaded / (time.perf_counter() - started)),
+            err=True)
+    return loaded
+
+
+@catalog_cli.command('generate')
+@click.option('--venues', default=10000, show_default=True)
+@click.option('--artists', default=20000, show_default=True)
+@click.option('--shows', default=1000000, show_default=True)
+@click.option('--past-days', default=730, show_default=True,
+              help='Days of past shows before today.')
+@click.option('--future-days', default=365, show_default=True,
+              help='Days of upcoming shows after today.')
+@click.option('--seed', default=0, show_default=True)
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True)
+def generate(venues, artists, shows, past_days, future_days, seed, batch_size):
+    """Load synthetic venues, artists and shows with skewed popularity.
+
+    Shows only use the venues and artists generated by the same run, so
+    they cannot overlap existing bookings."""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=past_days)
+    days = past_days + future_days
+    needed = busiest_slot(shows, start, days)
+    if needed > min(venues, artists):
+        raise click.UsageError(
+            '{} shows in {} days need at least {} venues and artists.'.format(
+                shows, days, needed))
+    started = time.perf_counter()
+
+    first_venue = (db.session.query(func.max(Venue.id)).scalar() or 0) + 1
+    first_artist = (db.session.query(func.max(Artist.id)).scalar() or 0) + 1
+    load_generated(Venue, VENUE_COLUMNS, generate_venues(venues, rng), batch_size)
+    load_generated(Artist, ARTIST_COLUMNS, generate_artists(artists, rng), batch_size)
+    venue_ids = [id for (id,) in db.session.query(Venue.id).filter(
+        Venue.id >= first_venue).order_by(Venue.id)]
+    artist_ids = [id for (id,) in db.session.query(Artist.id).filter(
+        Artist.id >= first_artist).order_by(Artist.id)]
+
+    postgresql = db.engine.dialect.name == 'postgresql'
+    if postgresql:
+        # the months of the generated shows, so they skip the default partition
+        end = start + timedelta(days=days)
+        create_show_partitions(start, (end.year - start.year) * 12 + end.month - start.month + 1)
+    loaded = load_generated(
+        Show, SHOW_COLUMNS,
+        generate_shows(venue_ids, artist_ids, shows, start, days, rng), batch_size)
+    if postgresql:
+        refresh_venue_stats()
+
+    click.echo('Generated {} venues, {} artists and {} shows in {:.1f}s.'.format(
+        len(venue_ids), len(artist_ids), loaded, time.perf_counter() - started))
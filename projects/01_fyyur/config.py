@@ -12,4 +12,85 @@ DATABASE_NAME = 'fyyur'
 SQLALCHEMY_DATABASE_URI = 'postgres://{}/{}'.format('localhost:5432', DATABASE_NAME)
 
 # Suppress warnings
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool, per worker process. Size it from the
+# fyyur_db_pool_wait_seconds histogram at /metrics
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 10))
+# seconds a request waits for a connection before failing
+DATABASE_POOL_TIMEOUT = 10
+# seconds after which a connection is replaced (below server/proxy idle limits)
+DATABASE_POOL_RECYCLE = 1800
+DATABASE_POOL_PRE_PING = True
+# milliseconds; 0 disables
+DATABASE_STATEMENT_TIMEOUT = int(os.environ.get('DATABASE_STATEMENT_TIMEOUT', 5000))
+DATABASE_IDLE_IN_TRANSACTION_TIMEOUT = 60000
+# connecting through PgBouncer in transaction pooling mode
+DATABASE_PGBOUNCER = os.environ.get('DATABASE_PGBOUNCER') == '1'
+
+# Read replicas, comma separated. GET requests read from one of them
+DATABASE_REPLICA_URIS = [
+    uri for uri in os.environ.get('DATABASE_REPLICA_URIS', '').split(',') if uri]
+SQLALCHEMY_BINDS = {
+    'replica_{}'.format(i): uri for i, uri in enumerate(DATABASE_REPLICA_URIS)}
+# seconds a client reads from the primary after a write (read-your-writes)
+REPLICA_STICKY_SECONDS = 5
+# seconds an unreachable replica is skipped
+REPLICA_RETRY_SECONDS = 10
+
+# Rendered venue and artist page cache
+PAGE_CACHE_SIZE = 1024
+PAGE_CACHE_TTL = 300
+# with a shared backend, seconds a worker keeps its own copy of a page
+PAGE_CACHE_LOCAL_TTL = 5
+PAGE_CACHE_REDIS_URL = os.environ.get('PAGE_CACHE_REDIS_URL')
+
+# seconds between a worker's checks for venues and artists added, renamed or
+# deleted by other workers and by `flask catalog`, for /search/suggest
+SUGGEST_REFRESH_SECONDS = 30
+# build the suggestion index at boot rather than on the first suggest request
+SUGGEST_WARMUP = os.environ.get('FYYUR_SUGGEST_WARMUP', '1') == '1'
+
+# Logging (when not in debug): JSON lines written off the request thread
+LOG_FILE = 'error.log'
+# 'external': all workers append to LOG_FILE, rotated by logrotate (its
+# default create mode works, the file is reopened once moved). 'size' and
+# 'time': each worker writes and rotates error-<pid>.log itself, at
+# LOG_MAX_BYTES or LOG_ROTATE_WHEN
+LOG_ROTATION = 'external'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_ROTATE_WHEN = 'midnight'
+LOG_BACKUP_COUNT = 10
+# records beyond this many waiting to be written are dropped
+LOG_QUEUE_SIZE = 10000
+
+# Request metrics served at /metrics. Under gunicorn, point METRICS_DIR at an
+# empty directory so every worker's numbers are summed into each scrape
+METRICS_DIR = os.environ.get('FYYUR_METRICS_DIR')
+# seconds between a worker's snapshot writes to METRICS_DIR
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Query instrumentation, on in debug and testing: statement counts per
+# request (X-Query-Count), N+1 warnings and EXPLAIN plans of slow queries
+SLOW_QUERY_SECONDS = 0.1
+N_PLUS_ONE_THRESHOLD = 3
+# most statements an endpoint may run; exceeding one fails under test
+QUERY_BUDGETS = {
+    'show_venue': 1,
+    'shows': 1,
+    'shows_feed': 1,
+    'api.venue': 3,
+    'api.shows': 2
+}
+
+# Fingerprinted, precompressed static files built by `flask assets build`
+# and served as /static/build/...; unused until a build has been made
+ASSETS_DIR = os.path.join(basedir, 'static', 'build')
+
+# Compiled templates, shared by every worker and kept across restarts; an
+# empty FYYUR_TEMPLATE_CACHE_DIR turns the cache off
+TEMPLATE_CACHE_DIR = os.environ.get(
+    'FYYUR_TEMPLATE_CACHE_DIR', os.path.join(basedir, '.template_cache'))
+# compile every template at boot rather than on its first request
+TEMPLATE_WARMUP = os.environ.get('FYYUR_TEMPLATE_WARMUP', '1') == '1'
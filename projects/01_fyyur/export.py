@@ -0,0 +1,99 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import io
+import csv
+import json
+from models import db, Venue, Artist, Show
+
+#----------------------------------------------------------------------------#
+# Catalog export.
+#----------------------------------------------------------------------------#
+
+# rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 2000
+# lines are sent in chunks of about this many characters
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_MODELS = {
+    'venues': Venue,
+    'artists': Artist,
+    'shows': Show
+}
+EXPORT_MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+
+
+def export_columns(model):
+    # derived columns are left out; the database rebuilds them on import
+    return [column for column in model.__table__.columns
+            if column.name not in ('search_document', 'during')]
+
+
+def export_rows(kind, since=None):
+    # rows changed at or after `since`, oldest change first, read through a
+    # server-side cursor so memory does not grow with the table. The last
+    # row's updated_at is the watermark for the next incremental export
+    model = EXPORT_MODELS[kind]
+    query = db.session.query(*export_columns(model))
+    if since is not None:
+        query = query.filter(model.updated_at >= since)
+    return query.order_by(model.updated_at, model.id).yield_per(
+        EXPORT_BATCH_SIZE)
+
+
+def export_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def csv_value(value):
+    # genres are ';' separated and booleans written as the forms of
+    # `flask catalog import` read them
+    if isinstance(value, list):
+        return ';'.join(value)
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return export_value(value)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps({key: export_value(value)
+                          for key, value in row._asdict().items()}) + '\n'
+
+
+def csv_lines(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([column.name for column in columns])
+    for row in rows:
+        writer.writerow([csv_value(value) for value in row])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def chunked(lines):
+    chunk = []
+    size = 0
+    for line in lines:
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def export_lines(kind, format='ndjson', since=None):
+    rows = export_rows(kind, since)
+    if format == 'csv':
+        return chunked(csv_lines(rows, export_columns(EXPORT_MODELS[kind])))
+    return chunked(ndjson_lines(rows))
@@ -0,0 +1,57 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from functools import lru_cache
+import dateutil.parser
+import babel.dates
+from babel import Locale
+
+#----------------------------------------------------------------------------#
+# Datetime filter.
+#----------------------------------------------------------------------------#
+
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma"
+}
+# distinct (value, format, locale) results kept per worker
+DATETIME_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=None)
+def compiled_pattern(format):
+    # babel parses the pattern string on every format_datetime call
+    return babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=None)
+def parsed_locale(locale):
+    return Locale.parse(locale)
+
+
+def to_datetime(value):
+    # typed start times are used as they are, ISO strings skip dateutil
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+
+
+@lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def cached_format_datetime(value, utcoffset, format, locale):
+    # utcoffset is part of the key: aware datetimes at the same instant in
+    # different zones compare equal but are displayed differently
+    date = to_datetime(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=babel.dates.UTC)
+    return compiled_pattern(format).apply(date, parsed_locale(locale))
+
+
+def format_datetime(value, format='medium', locale=None):
+    utcoffset = value.utcoffset() if isinstance(value, datetime) else None
+    return cached_format_datetime(
+        value, utcoffset, format, locale or babel.dates.LC_TIME)
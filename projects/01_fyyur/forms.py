@@ -1,13 +1,32 @@
 import re
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, URL, Optional, ValidationError
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, HiddenField, IntegerField
+from wtforms.validators import DataRequired, URL, Optional, ValidationError, NumberRange
 
 def validate_phone(form, field):
     results = re.match('^[0-9]{3}-[0-9]{3}-[0-9]{4}$', field.data)
     if results is None:
         raise ValidationError('Wrong phone number type')
+
+class TimestampField(DateTimeField):
+    # the form's own format, or ISO 8601 with an optional UTC offset as
+    # catalog exports write it; offsets are kept
+    def process_formdata(self, valuelist):
+        if not valuelist:
+            return
+        value = ' '.join(valuelist)
+        for format in (self.format, '%Y-%m-%d %H:%M:%S%z'):
+            try:
+                self.data = datetime.strptime(value, format)
+                return
+            except ValueError:
+                pass
+        try:
+            self.data = datetime.fromisoformat(value)
+        except ValueError:
+            self.data = None
+            raise ValueError(self.gettext('Not a valid datetime value'))
     
 class ShowForm(Form):
     artist_id = StringField(
@@ -16,13 +35,22 @@ class ShowForm(Form):
     venue_id = StringField(
         'venue_id'
     )
-    start_time = DateTimeField(
+    start_time = TimestampField(
         'start_time',
         validators=[DataRequired()],
         default= datetime.today()
     )
+    duration = IntegerField(
+        'duration',
+        validators=[Optional(), NumberRange(min=15, max=24 * 60)],
+        default=120
+    )
 
 class EditVenueForm(Form):
+    # the row version the form was filled from
+    version = HiddenField(
+        'version'
+    )
     name = StringField(
         'name',
     )
@@ -136,6 +164,10 @@ class EditVenueForm(Form):
     )
 
 class EditArtistForm(Form):
+    # the row version the form was filled from
+    version = HiddenField(
+        'version'
+    )
     name = StringField(
         'name', 
     )
@@ -0,0 +1,165 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import copy
+import json
+import time
+import queue
+import atexit
+import logging
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+    WatchedFileHandler
+)
+from flask import g, request, has_request_context
+
+#----------------------------------------------------------------------------#
+# Structured, queued logging.
+#----------------------------------------------------------------------------#
+
+REQUEST_FIELDS = ('route', 'endpoint', 'method', 'path', 'status', 'latency_ms')
+
+
+class JsonFormatter(logging.Formatter):
+    # one JSON object per line, with the request fields when there are any
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'source': '{}:{}'.format(record.pathname, record.lineno)
+        }
+        for field in REQUEST_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    # runs on the request thread, before the record is queued
+
+    def filter(self, record):
+        if has_request_context():
+            if request.url_rule is not None:
+                record.route = request.url_rule.rule
+            record.endpoint = request.endpoint
+            record.method = request.method
+            record.path = request.path
+            started = g.get('request_started')
+            if started is not None and getattr(record, 'latency_ms', None) is None:
+                record.latency_ms = round((time.perf_counter() - started) * 1000, 3)
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    # never blocks the request thread: when the listener falls behind (a
+    # stalled disk) records are dropped and counted instead
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # render the message and traceback on the request thread, keeping
+        # them apart so the listener can still write structured records
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def worker_filename(filename):
+    # error.log -> error-<pid>.log: workers rotating one file themselves
+    # would race each other's rollovers and lose records
+    root, extension = os.path.splitext(filename)
+    return '{}-{}{}'.format(root, os.getpid(), extension)
+
+
+def file_handler(config):
+    # 'external' (the default): every worker appends to LOG_FILE and reopens
+    # it once logrotate or the like has moved it; 'size' and 'time': each
+    # worker rotates a file of its own
+    filename = config.get('LOG_FILE', 'error.log')
+    rotation = config.get('LOG_ROTATION', 'external')
+    if rotation == 'external':
+        handler = WatchedFileHandler(filename, delay=True)
+    elif rotation == 'time':
+        handler = TimedRotatingFileHandler(
+            worker_filename(filename),
+            when=config.get('LOG_ROTATE_WHEN', 'midnight'),
+            backupCount=config.get('LOG_BACKUP_COUNT', 10),
+            delay=True)
+    else:
+        handler = RotatingFileHandler(
+            worker_filename(filename),
+            maxBytes=config.get('LOG_MAX_BYTES', 10 * 1024 * 1024),
+            backupCount=config.get('LOG_BACKUP_COUNT', 10),
+            delay=True)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def setup_logging(app):
+    # request threads only put records on a queue; a listener thread formats
+    # them as JSON and writes them to LOG_FILE (see file_handler)
+    level = app.config.get('LOG_LEVEL', logging.INFO)
+
+    def level_handler():
+        handler = file_handler(app.config)
+        handler.setLevel(level)
+        return handler
+
+    def log_queue():
+        return queue.Queue(app.config.get('LOG_QUEUE_SIZE', 10000))
+
+    queue_handler = DroppingQueueHandler(log_queue())
+    queue_handler.addFilter(RequestContextFilter())
+    listener = QueueListener(
+        queue_handler.queue, level_handler(), respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    def start_worker_listener():
+        # a worker forked after the app was loaded (gunicorn --preload) has
+        # no listener thread, and writes its own file when it rotates. The
+        # queue is new too: the parent's listener was waiting on the old one
+        queue_handler.queue = listener.queue = log_queue()
+        listener.handlers = (level_handler(),)
+        listener.start()
+
+    os.register_at_fork(after_in_child=start_worker_listener)
+
+    app.logger.setLevel(level)
+    app.logger.addHandler(queue_handler)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        app.logger.info('request', extra={'status': response.status_code})
+        return response
+
+    return listener
@@ -0,0 +1,272 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SERIES = ('histograms', 'requests', 'queries', 'in_progress', 'pool_waits',
+          'pool_timeouts')
+
+
+def label_key(*labels):
+    return json.dumps(labels)
+
+
+def observe(histograms, key, buckets, seconds):
+    histogram = histograms.get(key)
+    if histogram is None:
+        # one count per bucket, +Inf, then sum and count
+        histogram = histograms[key] = [0] * (len(buckets) + 3)
+    histogram[bisect_left(buckets, seconds)] += 1
+    histogram[-2] += seconds
+    histogram[-1] += 1
+
+
+class Metrics:
+    # per-process metrics; every update takes one short, uncontended lock.
+    # In multiprocess mode each worker also publishes a snapshot file that
+    # /metrics sums up, whichever worker serves the scrape
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.lock = threading.Lock()
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.flushed_at = 0.0
+        self.pid = os.getpid()
+        self.clear()
+
+    def clear(self):
+        self.histograms = {}
+        self.requests = {}
+        self.queries = {}
+        self.in_progress = {}
+        self.pool_waits = {}
+        self.pool_timeouts = {}
+
+    def forked(self):
+        # a worker forked from a process that had already counted (gunicorn
+        # --preload) starts empty and publishes under its own pid, or the
+        # workers would overwrite one file and /metrics would undercount
+        self.lock = threading.Lock()
+        self.flushed_at = 0.0
+        self.pid = os.getpid()
+        self.clear()
+
+    def configure(self, config):
+        self.directory = config.get('METRICS_DIR')
+        self.flush_interval = config.get('METRICS_FLUSH_INTERVAL', 1.0)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def start_request(self, endpoint):
+        key = label_key(endpoint)
+        with self.lock:
+            self.in_progress[key] = self.in_progress.get(key, 0) + 1
+
+    def end_request(self, endpoint):
+        key = label_key(endpoint)
+        with self.lock:
+            self.in_progress[key] = self.in_progress.get(key, 0) - 1
+
+    def observe_request(self, endpoint, method, status, seconds, queries):
+        requests_key = label_key(endpoint, method, str(status))
+        queries_key = label_key(endpoint)
+        with self.lock:
+            observe(self.histograms, label_key(endpoint, method),
+                    LATENCY_BUCKETS, seconds)
+            self.requests[requests_key] = self.requests.get(requests_key, 0) + 1
+            self.queries[queries_key] = self.queries.get(queries_key, 0) + queries
+        if self.directory and time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def observe_pool_checkout(self, seconds, timed_out=False):
+        # time spent waiting for a pooled database connection
+        key = label_key()
+        with self.lock:
+            observe(self.pool_waits, key, POOL_WAIT_BUCKETS, seconds)
+            if timed_out:
+                self.pool_timeouts[key] = self.pool_timeouts.get(key, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'pid': self.pid,
+                'histograms': {k: list(v) for k, v in self.histograms.items()},
+                'requests': dict(self.requests),
+                'queries': dict(self.queries),
+                'in_progress': dict(self.in_progress),
+                'pool_waits': {k: list(v) for k, v in self.pool_waits.items()},
+                'pool_timeouts': dict(self.pool_timeouts)
+            }
+
+    def flush(self):
+        self.flushed_at = time.monotonic()
+        path = os.path.join(self.directory, 'metrics-{}.json'.format(self.pid))
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def snapshots(self):
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def collect(self):
+        # counters and histograms of exited workers are kept, so totals
+        # never go backwards; their in-progress gauges are not
+        totals = {name: {} for name in SERIES}
+        for snapshot in self.snapshots():
+            alive = process_alive(snapshot['pid'])
+            for name in SERIES:
+                if name == 'in_progress' and not alive:
+                    continue
+                for key, value in snapshot.get(name, {}).items():
+                    if isinstance(value, list):
+                        total = totals[name].setdefault(key, [0] * len(value))
+                        for i, item in enumerate(value):
+                            total[i] += item
+                    else:
+                        totals[name][key] = totals[name].get(key, 0) + value
+        return totals
+
+    def render(self):
+        totals = self.collect()
+        histograms, requests = totals['histograms'], totals['requests']
+        queries, in_progress = totals['queries'], totals['in_progress']
+        lines = [
+            '# HELP fyyur_http_request_duration_seconds Request latency.',
+            '# TYPE fyyur_http_request_duration_seconds histogram'
+        ]
+        for key, values in sorted(histograms.items()):
+            endpoint, method = json.loads(key)
+            labels = 'endpoint="{}",method="{}"'.format(endpoint, method)
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), values):
+                cumulative += count
+                lines.append(
+                    'fyyur_http_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(
+                        labels, bound, cumulative))
+            lines.append('fyyur_http_request_duration_seconds_sum{{{}}} {}'.format(
+                labels, values[-2]))
+            lines.append('fyyur_http_request_duration_seconds_count{{{}}} {}'.format(
+                labels, values[-1]))
+
+        lines.extend([
+            '# HELP fyyur_http_requests_total Requests by status code.',
+            '# TYPE fyyur_http_requests_total counter'
+        ])
+        for key, value in sorted(requests.items()):
+            endpoint, method, status = json.loads(key)
+            lines.append(
+                'fyyur_http_requests_total{{endpoint="{}",method="{}",status="{}"}} {}'.format(
+                    endpoint, method, status, value))
+
+        lines.extend([
+            '# HELP fyyur_http_requests_in_progress Requests being served.',
+            '# TYPE fyyur_http_requests_in_progress gauge'
+        ])
+        for key, value in sorted(in_progress.items()):
+            lines.append('fyyur_http_requests_in_progress{{endpoint="{}"}} {}'.format(
+                json.loads(key)[0], value))
+
+        lines.extend([
+            '# HELP fyyur_db_queries_total SQL statements executed by requests.',
+            '# TYPE fyyur_db_queries_total counter'
+        ])
+        for key, value in sorted(queries.items()):
+            lines.append('fyyur_db_queries_total{{endpoint="{}"}} {}'.format(
+                json.loads(key)[0], value))
+
+        lines.extend([
+            '# HELP fyyur_db_pool_wait_seconds Wait for a pooled db connection.',
+            '# TYPE fyyur_db_pool_wait_seconds histogram'
+        ])
+        for values in totals['pool_waits'].values():
+            cumulative = 0
+            for bound, count in zip(POOL_WAIT_BUCKETS + ('+Inf',), values):
+                cumulative += count
+                lines.append('fyyur_db_pool_wait_seconds_bucket{{le="{}"}} {}'.format(
+                    bound, cumulative))
+            lines.append('fyyur_db_pool_wait_seconds_sum {}'.format(values[-2]))
+            lines.append('fyyur_db_pool_wait_seconds_count {}'.format(values[-1]))
+
+        lines.extend([
+            '# HELP fyyur_db_pool_timeouts_total Checkouts that gave up waiting.',
+            '# TYPE fyyur_db_pool_timeouts_total counter',
+            'fyyur_db_pool_timeouts_total {}'.format(
+                sum(totals['pool_timeouts'].values()))
+        ])
+
+        return '\n'.join(lines) + '\n'
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+metrics = Metrics()
+os.register_at_fork(after_in_child=metrics.forked)
+
+
+def request_endpoint():
+    # unmatched urls share one label so 404 scans cannot grow the series
+    return request.endpoint or 'unmatched'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'metrics_queries' in g:
+        g.metrics_queries += 1
+
+
+def setup_metrics(app):
+    metrics.configure(app.config)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        metrics.start_request(request_endpoint())
+
+    @app.after_request
+    def observe_request_metrics(response):
+        if 'metrics_started' in g:
+            metrics.observe_request(
+                request_endpoint(), request.method, response.status_code,
+                time.perf_counter() - g.metrics_started, g.metrics_queries)
+        return response
+
+    @app.teardown_request
+    def end_request_metrics(exception=None):
+        if 'metrics_started' in g:
+            metrics.end_request(request_endpoint())
@@ -0,0 +1,37 @@
+"""venue statistics materialized view
+
+Revision ID: 2ac7f4b66792
+Revises: d4bc1fd2a755
+Create Date: 2026-10-18 14:21:36.518904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2ac7f4b66792'
+down_revision = 'd4bc1fd2a755'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+    CREATE MATERIALIZED VIEW venue_stats AS
+    SELECT venues.id AS venue_id,
+           count(shows.id) FILTER (WHERE shows.start_time >= now())::integer AS upcoming_shows_count,
+           count(shows.id) FILTER (WHERE shows.start_time < now())::integer AS past_shows_count,
+           min(shows.start_time) FILTER (WHERE shows.start_time >= now()) AS next_show_time,
+           count(DISTINCT shows.artist_id)::integer AS artists_hosted_count,
+           now() AS refreshed_at
+    FROM venues LEFT JOIN shows ON shows.venue_id = venues.id
+    GROUP BY venues.id
+    """)
+    # the unique index is what allows REFRESH MATERIALIZED VIEW CONCURRENTLY
+    op.create_index('ix_venue_stats_venue_id', 'venue_stats', ['venue_id'],
+                    unique=True)
+
+
+def downgrade():
+    op.execute('DROP MATERIALIZED VIEW venue_stats')
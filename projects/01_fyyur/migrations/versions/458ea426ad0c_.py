@@ -0,0 +1,38 @@
+"""typed show start time with per artist and per venue indexes
+
+Revision ID: 458ea426ad0c
+Revises: 262c688cbdd8
+Create Date: 2026-10-18 09:12:40.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '458ea426ad0c'
+down_revision = '262c688cbdd8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.alter_column('shows', 'start_time',
+               existing_type=sa.String(),
+               type_=sa.DateTime(timezone=True),
+               existing_nullable=False,
+               postgresql_using='start_time::timestamp with time zone')
+    op.create_index('ix_shows_artist_id_start_time', 'shows',
+                    ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_shows_venue_id_start_time', 'shows',
+                    ['venue_id', 'start_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_venue_id_start_time', table_name='shows')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
+    op.alter_column('shows', 'start_time',
+               existing_type=sa.DateTime(timezone=True),
+               type_=sa.String(),
+               existing_nullable=False,
+               postgresql_using="to_char(start_time, 'YYYY-MM-DD HH24:MI:SS')")
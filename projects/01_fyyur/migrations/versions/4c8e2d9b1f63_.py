@@ -0,0 +1,63 @@
+"""show duration, time range and double booking exclusion constraints
+
+Revision ID: 4c8e2d9b1f63
+Revises: b5e19c3d7a42
+Create Date: 2026-10-18 16:47:53.902117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e2d9b1f63'
+down_revision = 'b5e19c3d7a42'
+branch_labels = None
+depends_on = None
+
+# timestamptz + interval is not immutable, so the range is kept by a trigger
+# rather than a generated column
+SHOW_DURING_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_show_during_update() RETURNS trigger AS $$
+BEGIN
+  NEW.during := tstzrange(NEW.start_time, NEW.start_time + make_interval(mins => NEW.duration));
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+SHOW_DURING_TRIGGER = """
+CREATE TRIGGER shows_during_update
+BEFORE INSERT OR UPDATE OF start_time, duration
+ON shows FOR EACH ROW EXECUTE PROCEDURE fyyur_show_during_update()
+"""
+
+
+def upgrade():
+    # btree_gist lets the integer ids share a GiST index with the range
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    op.add_column('shows', sa.Column('duration', sa.Integer(), server_default='120', nullable=False))
+    op.add_column('shows', sa.Column('during', postgresql.TSTZRANGE(), nullable=True))
+    op.execute(SHOW_DURING_FUNCTION)
+    op.execute(SHOW_DURING_TRIGGER)
+    op.execute("UPDATE shows SET during = tstzrange(start_time, start_time + make_interval(mins => duration))")
+    op.alter_column('shows', 'during', nullable=False)
+    # fails while existing shows overlap; those have to be moved or removed
+    # first (SELECT a.id, b.id FROM shows a JOIN shows b ON a.venue_id =
+    # b.venue_id AND a.id < b.id AND a.during && b.during)
+    op.create_exclude_constraint(
+        'shows_venue_id_during_excl', 'shows',
+        ('venue_id', '='), ('during', '&&'), using='gist')
+    op.create_exclude_constraint(
+        'shows_artist_id_during_excl', 'shows',
+        ('artist_id', '='), ('during', '&&'), using='gist')
+
+
+def downgrade():
+    op.drop_constraint('shows_artist_id_during_excl', 'shows')
+    op.drop_constraint('shows_venue_id_during_excl', 'shows')
+    op.execute('DROP TRIGGER shows_during_update ON shows')
+    op.execute('DROP FUNCTION fyyur_show_during_update()')
+    op.drop_column('shows', 'during')
+    op.drop_column('shows', 'duration')
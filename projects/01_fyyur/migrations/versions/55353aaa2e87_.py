@@ -0,0 +1,25 @@
+"""show feed keyset index
+
+Revision ID: 55353aaa2e87
+Revises: 458ea426ad0c
+Create Date: 2026-10-18 10:02:17.540611
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '55353aaa2e87'
+down_revision = '458ea426ad0c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_start_time_id', 'shows',
+                    ['start_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_start_time_id', table_name='shows')
@@ -0,0 +1,52 @@
+"""bound show durations
+
+Revision ID: 5a2d8e6f0c17
+Revises: 7e3a5c1d9b20
+Create Date: 2026-10-18 21:12:44.309512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a2d8e6f0c17'
+down_revision = '7e3a5c1d9b20'
+branch_labels = None
+depends_on = None
+
+# partitions are created with the constraints of shows, or attaching them
+# fails on ck_shows_duration
+SHOW_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_create_show_partition(month date) RETURNS text AS $$
+DECLARE
+  name text := 'shows_' || to_char(month, 'YYYY_MM');
+  lower timestamptz := date_trunc('month', month)::timestamp AT TIME ZONE 'UTC';
+  upper timestamptz := (date_trunc('month', month) + interval '1 month')::timestamp AT TIME ZONE 'UTC';
+BEGIN
+  IF to_regclass(name) IS NOT NULL THEN
+    RETURN name;
+  END IF;
+  EXECUTE format('CREATE TABLE %I (LIKE shows INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', name);
+  EXECUTE format('INSERT INTO %I SELECT * FROM shows_default WHERE start_time >= %L AND start_time < %L', name, lower, upper);
+  EXECUTE format('DELETE FROM shows_default WHERE start_time >= %L AND start_time < %L', lower, upper);
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist (venue_id WITH =, during WITH &&)', name, name || '_venue_id_during_excl');
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist (artist_id WITH =, during WITH &&)', name, name || '_artist_id_during_excl');
+  EXECUTE format('ALTER TABLE shows ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', name, lower, upper);
+  RETURN name;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def upgrade():
+    # added to every partition; fails while a show is outside the bounds
+    # (SELECT id FROM shows WHERE duration NOT BETWEEN 15 AND 1440)
+    op.create_check_constraint(
+        'ck_shows_duration', 'shows', 'duration BETWEEN 15 AND 1440')
+    op.execute(SHOW_PARTITION_FUNCTION)
+
+
+def downgrade():
+    op.execute(SHOW_PARTITION_FUNCTION.replace(' INCLUDING CONSTRAINTS', ''))
+    op.drop_constraint('ck_shows_duration', 'shows')
@@ -0,0 +1,177 @@
+"""partition shows by month of start_time
+
+Revision ID: 7e3a5c1d9b20
+Revises: 4c8e2d9b1f63
+Create Date: 2026-10-18 17:35:08.611942
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e3a5c1d9b20'
+down_revision = '4c8e2d9b1f63'
+branch_labels = None
+depends_on = None
+
+SHOW_DURING_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_show_during_update() RETURNS trigger AS $$
+DECLARE
+  conflict text;
+BEGIN
+  NEW.during := tstzrange(NEW.start_time, NEW.start_time + make_interval(mins => NEW.duration));
+  -- exclusion constraints only see their own partition; this index probe
+  -- (pruned to the partitions a show of up to a day can overlap from) also
+  -- catches overlaps across a month boundary
+  SELECT CASE WHEN venue_id = NEW.venue_id THEN 'shows_venue_id_during_excl'
+              ELSE 'shows_artist_id_during_excl' END INTO conflict
+  FROM shows
+  WHERE (venue_id = NEW.venue_id OR artist_id = NEW.artist_id)
+    AND during && NEW.during AND id <> NEW.id
+    AND start_time > NEW.start_time - interval '1 day'
+    AND start_time < upper(NEW.during)
+  LIMIT 1;
+  IF conflict IS NOT NULL THEN
+    RAISE EXCEPTION 'show % overlaps another booking', NEW.id
+      USING ERRCODE = 'exclusion_violation', CONSTRAINT = conflict;
+  END IF;
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+UNPARTITIONED_DURING_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_show_during_update() RETURNS trigger AS $$
+BEGIN
+  NEW.during := tstzrange(NEW.start_time, NEW.start_time + make_interval(mins => NEW.duration));
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+SHOW_DURING_TRIGGER = """
+CREATE TRIGGER shows_during_update
+BEFORE INSERT OR UPDATE OF start_time, duration
+ON shows FOR EACH ROW EXECUTE PROCEDURE fyyur_show_during_update()
+"""
+
+SHOW_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_create_show_partition(month date) RETURNS text AS $$
+DECLARE
+  name text := 'shows_' || to_char(month, 'YYYY_MM');
+  lower timestamptz := date_trunc('month', month)::timestamp AT TIME ZONE 'UTC';
+  upper timestamptz := (date_trunc('month', month) + interval '1 month')::timestamp AT TIME ZONE 'UTC';
+BEGIN
+  IF to_regclass(name) IS NOT NULL THEN
+    RETURN name;
+  END IF;
+  EXECUTE format('CREATE TABLE %I (LIKE shows INCLUDING DEFAULTS)', name);
+  EXECUTE format('INSERT INTO %I SELECT * FROM shows_default WHERE start_time >= %L AND start_time < %L', name, lower, upper);
+  EXECUTE format('DELETE FROM shows_default WHERE start_time >= %L AND start_time < %L', lower, upper);
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist (venue_id WITH =, during WITH &&)', name, name || '_venue_id_during_excl');
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist (artist_id WITH =, during WITH &&)', name, name || '_artist_id_during_excl');
+  EXECUTE format('ALTER TABLE shows ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', name, lower, upper);
+  RETURN name;
+END
+$$ LANGUAGE plpgsql
+"""
+
+VENUE_STATS_VIEW = """
+CREATE MATERIALIZED VIEW venue_stats AS
+SELECT venues.id AS venue_id,
+       count(shows.id) FILTER (WHERE shows.start_time >= now())::integer AS upcoming_shows_count,
+       count(shows.id) FILTER (WHERE shows.start_time < now())::integer AS past_shows_count,
+       min(shows.start_time) FILTER (WHERE shows.start_time >= now()) AS next_show_time,
+       count(DISTINCT shows.artist_id)::integer AS artists_hosted_count,
+       now() AS refreshed_at
+FROM venues LEFT JOIN shows ON shows.venue_id = venues.id
+GROUP BY venues.id
+"""
+
+SHOW_INDEXES = (
+    ('ix_shows_artist_id_start_time', ['artist_id', 'start_time']),
+    ('ix_shows_venue_id_start_time', ['venue_id', 'start_time']),
+    ('ix_shows_start_time_id', ['start_time', 'id']),
+    ('ix_shows_updated_at', ['updated_at']),
+)
+
+SHOW_COLUMNS = 'id, venue_id, artist_id, start_time, duration, updated_at'
+
+
+def drop_dependents():
+    # venue_stats reads shows, and index names are unique per schema
+    op.execute('DROP MATERIALIZED VIEW venue_stats')
+    for name, _ in SHOW_INDEXES:
+        op.drop_index(name, table_name='shows')
+    op.execute('DROP TRIGGER shows_during_update ON shows')
+    op.execute('ALTER TABLE shows RENAME TO shows_old')
+    op.execute('ALTER INDEX shows_pkey RENAME TO shows_old_pkey')
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY NONE')
+
+
+def create_dependents():
+    for name, columns in SHOW_INDEXES:
+        op.create_index(name, 'shows', columns, unique=False)
+    op.execute('ALTER SEQUENCE shows_id_seq OWNED BY shows.id')
+    op.execute(SHOW_DURING_TRIGGER)
+    op.execute(VENUE_STATS_VIEW)
+    op.create_index('ix_venue_stats_venue_id', 'venue_stats', ['venue_id'],
+                    unique=True)
+
+
+def upgrade():
+    # needs PostgreSQL 13+ (row triggers on partitioned tables). The rows are
+    # copied, so this takes a while and locks shows on a large table
+    drop_dependents()
+    op.execute("""
+    CREATE TABLE shows (
+      id integer NOT NULL DEFAULT nextval('shows_id_seq'),
+      venue_id integer NOT NULL REFERENCES venues (id) ON DELETE CASCADE,
+      artist_id integer NOT NULL REFERENCES artists (id) ON DELETE CASCADE,
+      start_time timestamp with time zone NOT NULL,
+      duration integer NOT NULL DEFAULT 120,
+      during tstzrange NOT NULL,
+      updated_at timestamp with time zone NOT NULL DEFAULT now(),
+      PRIMARY KEY (id, start_time)
+    ) PARTITION BY RANGE (start_time)
+    """)
+    op.execute(SHOW_DURING_FUNCTION)
+    op.execute(SHOW_PARTITION_FUNCTION)
+    op.execute('CREATE TABLE shows_default PARTITION OF shows DEFAULT')
+    op.execute('ALTER TABLE shows_default ADD CONSTRAINT shows_default_venue_id_during_excl EXCLUDE USING gist (venue_id WITH =, during WITH &&)')
+    op.execute('ALTER TABLE shows_default ADD CONSTRAINT shows_default_artist_id_during_excl EXCLUDE USING gist (artist_id WITH =, during WITH &&)')
+    # a partition for every month with shows, up to a year ahead
+    op.execute("""
+    SELECT fyyur_create_show_partition(month::date)
+    FROM generate_series(
+      date_trunc('month', coalesce((SELECT min(start_time) FROM shows_old), now()) AT TIME ZONE 'UTC'),
+      date_trunc('month', now() AT TIME ZONE 'UTC') + interval '12 months',
+      interval '1 month') AS month
+    """)
+    create_dependents()
+    op.execute('INSERT INTO shows ({0}) SELECT {0} FROM shows_old'.format(SHOW_COLUMNS))
+    op.execute('DROP TABLE shows_old')
+
+
+def downgrade():
+    drop_dependents()
+    op.execute("""
+    CREATE TABLE shows (
+      id integer NOT NULL DEFAULT nextval('shows_id_seq') PRIMARY KEY,
+      venue_id integer NOT NULL REFERENCES venues (id) ON DELETE CASCADE,
+      artist_id integer NOT NULL REFERENCES artists (id) ON DELETE CASCADE,
+      start_time timestamp with time zone NOT NULL,
+      duration integer NOT NULL DEFAULT 120,
+      during tstzrange NOT NULL,
+      updated_at timestamp with time zone NOT NULL DEFAULT now(),
+      CONSTRAINT shows_venue_id_during_excl EXCLUDE USING gist (venue_id WITH =, during WITH &&),
+      CONSTRAINT shows_artist_id_during_excl EXCLUDE USING gist (artist_id WITH =, during WITH &&)
+    )
+    """)
+    op.execute(UNPARTITIONED_DURING_FUNCTION)
+    create_dependents()
+    op.execute('INSERT INTO shows ({0}) SELECT {0} FROM shows_old'.format(SHOW_COLUMNS))
+    # drops the partitions with it
+    op.execute('DROP TABLE shows_old')
+    op.execute('DROP FUNCTION fyyur_create_show_partition(date)')
@@ -0,0 +1,58 @@
+"""search documents for venue and artist full-text search
+
+Revision ID: 9ea4c99858f6
+Revises: e4b1f18ccfb5
+Create Date: 2026-10-18 11:27:48.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '9ea4c99858f6'
+down_revision = 'e4b1f18ccfb5'
+branch_labels = None
+depends_on = None
+
+# venues and artists share the columns the document is built from, so one
+# trigger function serves both tables
+SEARCH_DOCUMENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_search_document_update() RETURNS trigger AS $$
+BEGIN
+  NEW.search_document :=
+    setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(array_to_string(NEW.genres, ' '), '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(NEW.seeking_description, '')), 'C');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+SEARCH_DOCUMENT_TRIGGER = """
+CREATE TRIGGER {table}_search_document_update
+BEFORE INSERT OR UPDATE OF name, city, state, genres, seeking_description
+ON {table} FOR EACH ROW EXECUTE PROCEDURE fyyur_search_document_update()
+"""
+
+
+def upgrade():
+    op.execute(SEARCH_DOCUMENT_FUNCTION)
+    for table in ('venues', 'artists'):
+        op.add_column(table, sa.Column('search_document', postgresql.TSVECTOR(), nullable=True))
+        op.execute(SEARCH_DOCUMENT_TRIGGER.format(table=table))
+        # fire the trigger once for the existing rows
+        op.execute('UPDATE {} SET name = name'.format(table))
+        op.create_index('ix_{}_search_document'.format(table), table,
+                        ['search_document'], unique=False,
+                        postgresql_using='gin')
+
+
+def downgrade():
+    for table in ('artists', 'venues'):
+        op.drop_index('ix_{}_search_document'.format(table), table_name=table)
+        op.execute('DROP TRIGGER {0}_search_document_update ON {0}'.format(table))
+        op.drop_column(table, 'search_document')
+    op.execute('DROP FUNCTION fyyur_search_document_update()')
@@ -0,0 +1,30 @@
+"""updated_at watermarks for incremental exports
+
+Revision ID: 9f28fbf511f0
+Revises: 9ea4c99858f6
+Create Date: 2026-10-18 13:05:31.664270
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f28fbf511f0'
+down_revision = '9ea4c99858f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venues', 'artists', 'shows'):
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True),
+                                       server_default=sa.text('now()'), nullable=False))
+        op.create_index('ix_{}_updated_at'.format(table), table,
+                        ['updated_at'], unique=False)
+
+
+def downgrade():
+    for table in ('shows', 'artists', 'venues'):
+        op.drop_index('ix_{}_updated_at'.format(table), table_name=table)
+        op.drop_column(table, 'updated_at')
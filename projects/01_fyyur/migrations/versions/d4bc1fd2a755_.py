@@ -0,0 +1,28 @@
+"""GIN indexes on venue and artist genres
+
+Revision ID: d4bc1fd2a755
+Revises: 9f28fbf511f0
+Create Date: 2026-10-18 13:48:12.207753
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4bc1fd2a755'
+down_revision = '9f28fbf511f0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_venues_genres', 'venues', ['genres'], unique=False,
+                    postgresql_using='gin')
+    op.create_index('ix_artists_genres', 'artists', ['genres'], unique=False,
+                    postgresql_using='gin')
+
+
+def downgrade():
+    op.drop_index('ix_artists_genres', table_name='artists')
+    op.drop_index('ix_venues_genres', table_name='venues')
@@ -1,19 +1,128 @@
 import os
+import time
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
+from sqlalchemy import event, exc, DDL
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.dialects.postgresql import TSVECTOR, TSTZRANGE
+from metrics import metrics
+from routing import RoutingSQLAlchemy
 
 # connect to a local postgresql database
 app = Flask(__name__)
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
 migrate = Migrate(app, db)
 
+#----------------------------------------------------------------------------#
+# Engine.
+#----------------------------------------------------------------------------#
+
+class TimedQueuePool(QueuePool):
+  # reports how long each checkout waited for a connection, to size the pool
+
+  def _do_get(self):
+    started = time.perf_counter()
+    try:
+      connection = super()._do_get()
+    except exc.TimeoutError:
+      metrics.observe_pool_checkout(time.perf_counter() - started, timed_out=True)
+      raise
+    metrics.observe_pool_checkout(time.perf_counter() - started)
+    return connection
+
+
+def timeout_settings(config):
+  return (
+    ('statement_timeout', config.get('DATABASE_STATEMENT_TIMEOUT', 0)),
+    ('idle_in_transaction_session_timeout', config.get('DATABASE_IDLE_IN_TRANSACTION_TIMEOUT', 0)),
+  )
+
+
+def is_postgresql_uri(uri):
+  return make_url(uri).get_backend_name() in ('postgresql', 'postgres')
+
+
+def configure_engine(app):
+  # pool and timeout settings from config.py; the engine is created from them
+  # on first use. Explicit SQLALCHEMY_ENGINE_OPTIONS win. They are psycopg2
+  # and QueuePool settings, so other databases (sqlite stand-ins) keep the
+  # Flask-SQLAlchemy defaults
+  config = app.config
+  options = {}
+  uri = config.get('SQLALCHEMY_DATABASE_URI')
+  if uri and is_postgresql_uri(uri):
+    options = postgresql_engine_options(config)
+  options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+  config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def postgresql_engine_options(config):
+  options = {
+    'poolclass': TimedQueuePool,
+    'pool_size': config.get('DATABASE_POOL_SIZE', 5),
+    'max_overflow': config.get('DATABASE_MAX_OVERFLOW', 10),
+    'pool_timeout': config.get('DATABASE_POOL_TIMEOUT', 30),
+    'pool_recycle': config.get('DATABASE_POOL_RECYCLE', -1),
+    'pool_pre_ping': config.get('DATABASE_POOL_PRE_PING', True),
+  }
+  settings = timeout_settings(config)
+  if config.get('DATABASE_PGBOUNCER'):
+    # transaction pooling gives every transaction whichever server connection
+    # is free and rejects startup options, so session settings would leak to
+    # other clients: the timeouts are set per transaction instead
+    options['execution_options'] = {
+      'transaction_settings': ['SET LOCAL {} = {}'.format(name, int(value)) for name, value in settings]
+    }
+  else:
+    options['connect_args'] = {
+      'options': ' '.join('-c {}={}'.format(name, int(value)) for name, value in settings)
+    }
+  return options
+
+
+@event.listens_for(Engine, 'begin')
+def apply_transaction_settings(conn):
+  # a plain DBAPI cursor, so these are not counted as the request's queries
+  settings = conn.get_execution_options().get('transaction_settings')
+  if settings:
+    cursor = conn.connection.cursor()
+    try:
+      for statement in settings:
+        cursor.execute(statement)
+    finally:
+      cursor.close()
+
+
+def apply_changes(record, values):
+  # assign only the values that differ from the stored ones, so the flush
+  # updates just those columns, or skips the UPDATE. Empty strings and
+  # lists count as unset, like the NULLs rows are imported with
+  changed = [name for name, value in values.items()
+             if (getattr(record, name) or None) != (value or None)]
+  for name in changed:
+    setattr(record, name, values[name])
+  return changed
+
+
+def without_statement_timeout():
+  # for maintenance statements (bulk loads, view refreshes) that are allowed
+  # to run longer than a request; lasts until the end of the transaction
+  db.session.execute('SET LOCAL statement_timeout = 0')
+
 #----------------------------------------------------------------------------#
 # Models.
 #----------------------------------------------------------------------------#
 
 class Venue(db.Model):
   __tablename__ = 'venues'
+  __table_args__ = (
+    db.Index('ix_venues_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_venues_search_document', 'search_document', postgresql_using='gin'),
+    db.Index('ix_venues_genres', 'genres', postgresql_using='gin'),
+  )
 
   # implement any missing fields, as a database migration using Flask-Migrate
   id = db.Column(db.Integer, primary_key=True)
@@ -28,8 +137,15 @@ class Venue(db.Model):
   image_link = db.Column(db.String(500))
   seeking_talent = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String(120))
+  # maintained by the fyyur_search_document_update trigger
+  search_document = db.deferred(db.Column(TSVECTOR, server_default=db.FetchedValue(), server_onupdate=db.FetchedValue()))
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True, server_default=db.func.now(), onupdate=db.func.now())
+  # bumped by every UPDATE, which also checks it (optimistic locking)
+  version = db.Column(db.Integer, nullable=False, server_default='1')
   shows = db.relationship('Show', backref='venue_shows', cascade='all, delete-orphan', passive_deletes=True)
 
+  __mapper_args__ = {'version_id_col': version}
+
   def format(self):
     return {
       'id': self.id,
@@ -49,6 +165,11 @@ class Venue(db.Model):
 
 class Artist(db.Model):
   __tablename__ = 'artists'
+  __table_args__ = (
+    db.Index('ix_artists_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    db.Index('ix_artists_search_document', 'search_document', postgresql_using='gin'),
+    db.Index('ix_artists_genres', 'genres', postgresql_using='gin'),
+  )
 
   # implement any missing fields, as a database migration using Flask-Migrate
   id = db.Column(db.Integer, primary_key=True)
@@ -62,15 +183,153 @@ class Artist(db.Model):
   image_link = db.Column(db.String(500))
   seeking_venue = db.Column(db.Boolean, default=False)
   seeking_description = db.Column(db.String(120))
+  # maintained by the fyyur_search_document_update trigger
+  search_document = db.deferred(db.Column(TSVECTOR, server_default=db.FetchedValue(), server_onupdate=db.FetchedValue()))
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True, server_default=db.func.now(), onupdate=db.func.now())
+  # bumped by every UPDATE, which also checks it (optimistic locking)
+  version = db.Column(db.Integer, nullable=False, server_default='1')
   shows = db.relationship('Show', backref='artist_shows', cascade='all, delete-orphan', passive_deletes=True)
 
+  __mapper_args__ = {'version_id_col': version}
+
+
+# Same definitions as migration 9ea4c99858f6, so that create_all (tests)
+# builds them too. venues and artists share the columns the document is
+# built from, so one trigger function serves both tables.
+SEARCH_DOCUMENT_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_search_document_update() RETURNS trigger AS $$
+BEGIN
+  NEW.search_document :=
+    setweight(to_tsvector('english', coalesce(NEW.name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(NEW.city, '') || ' ' || coalesce(NEW.state, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(array_to_string(NEW.genres, ' '), '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(NEW.seeking_description, '')), 'C');
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+SEARCH_DOCUMENT_TRIGGER = """
+CREATE TRIGGER {table}_search_document_update
+BEFORE INSERT OR UPDATE OF name, city, state, genres, seeking_description
+ON {table} FOR EACH ROW EXECUTE PROCEDURE fyyur_search_document_update()
+"""
+
+for table in (Venue.__table__, Artist.__table__):
+  for statement in (SEARCH_DOCUMENT_FUNCTION, SEARCH_DOCUMENT_TRIGGER.format(table=table.name)):
+    event.listen(table, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
 # Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
 class Show(db.Model):
   __tablename__ = 'shows'
+  __table_args__ = (
+    db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_shows_venue_id_start_time', 'venue_id', 'start_time'),
+    db.Index('ix_shows_start_time_id', 'start_time', 'id'),
+    # the same bounds as ShowForm.duration, for writes that skip the form
+    db.CheckConstraint('duration BETWEEN 15 AND 1440', name='ck_shows_duration'),
+    # one partition per month of start_time (see partitions.py); indexes are
+    # created on every partition, the exclusion constraints by
+    # fyyur_create_show_partition, as a partitioned table cannot carry them
+    {'postgresql_partition_by': 'RANGE (start_time)'},
+  )
 
-  id = db.Column(db.Integer, primary_key=True, nullable=False)
+  # the partition key has to be part of the primary key
+  id = db.Column(db.Integer, primary_key=True, autoincrement=True, nullable=False)
   venue_id = db.Column(db.Integer, db.ForeignKey('venues.id', ondelete="CASCADE"), nullable=False)
   artist_id = db.Column(db.Integer, db.ForeignKey('artists.id', ondelete="CASCADE"), nullable=False)
-  start_time = db.Column(db.String, nullable=False)
+  start_time = db.Column(db.DateTime(timezone=True), primary_key=True, nullable=False)
+  # minutes
+  duration = db.Column(db.Integer, nullable=False, server_default='120')
+  # [start_time, start_time + duration), maintained by the fyyur_show_during_update trigger
+  during = db.deferred(db.Column(TSTZRANGE, nullable=False, server_default=db.FetchedValue(), server_onupdate=db.FetchedValue()))
+  updated_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True, server_default=db.func.now(), onupdate=db.func.now())
   venues = db.relationship('Venue', backref='venues')
   artists = db.relationship('Artist', backref='artists')
+
+
+# Same definitions as migrations 7e3a5c1d9b20 and 5a2d8e6f0c17, so that
+# create_all (tests) builds them too. timestamptz + interval is not
+# immutable, which rules out a generated column for the range.
+SHOW_DURING_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_show_during_update() RETURNS trigger AS $$
+DECLARE
+  conflict text;
+BEGIN
+  NEW.during := tstzrange(NEW.start_time, NEW.start_time + make_interval(mins => NEW.duration));
+  -- exclusion constraints only see their own partition; this index probe
+  -- (pruned to the partitions a show of up to a day can overlap from) also
+  -- catches overlaps across a month boundary
+  SELECT CASE WHEN venue_id = NEW.venue_id THEN 'shows_venue_id_during_excl'
+              ELSE 'shows_artist_id_during_excl' END INTO conflict
+  FROM shows
+  WHERE (venue_id = NEW.venue_id OR artist_id = NEW.artist_id)
+    AND during && NEW.during AND id <> NEW.id
+    AND start_time > NEW.start_time - interval '1 day'
+    AND start_time < upper(NEW.during)
+  LIMIT 1;
+  IF conflict IS NOT NULL THEN
+    RAISE EXCEPTION 'show % overlaps another booking', NEW.id
+      USING ERRCODE = 'exclusion_violation', CONSTRAINT = conflict;
+  END IF;
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+SHOW_DURING_TRIGGER = """
+CREATE TRIGGER shows_during_update
+BEFORE INSERT OR UPDATE OF start_time, duration
+ON shows FOR EACH ROW EXECUTE PROCEDURE fyyur_show_during_update()
+"""
+
+# Creates the partition of the month holding `month` (UTC), with the CHECK
+# constraints of shows (ATTACH requires them) and its exclusion constraints,
+# moving any of its rows out of the default partition.
+SHOW_PARTITION_FUNCTION = """
+CREATE OR REPLACE FUNCTION fyyur_create_show_partition(month date) RETURNS text AS $$
+DECLARE
+  name text := 'shows_' || to_char(month, 'YYYY_MM');
+  lower timestamptz := date_trunc('month', month)::timestamp AT TIME ZONE 'UTC';
+  upper timestamptz := (date_trunc('month', month) + interval '1 month')::timestamp AT TIME ZONE 'UTC';
+BEGIN
+  IF to_regclass(name) IS NOT NULL THEN
+    RETURN name;
+  END IF;
+  EXECUTE format('CREATE TABLE %I (LIKE shows INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', name);
+  EXECUTE format('INSERT INTO %I SELECT * FROM shows_default WHERE start_time >= %L AND start_time < %L', name, lower, upper);
+  EXECUTE format('DELETE FROM shows_default WHERE start_time >= %L AND start_time < %L', lower, upper);
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist (venue_id WITH =, during WITH &&)', name, name || '_venue_id_during_excl');
+  EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I EXCLUDE USING gist (artist_id WITH =, during WITH &&)', name, name || '_artist_id_during_excl');
+  EXECUTE format('ALTER TABLE shows ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)', name, lower, upper);
+  RETURN name;
+END
+$$ LANGUAGE plpgsql
+"""
+
+# rows outside every monthly partition (far future bookings) land here
+SHOW_DEFAULT_PARTITION = """
+CREATE TABLE shows_default PARTITION OF shows DEFAULT;
+ALTER TABLE shows_default ADD CONSTRAINT shows_default_venue_id_during_excl EXCLUDE USING gist (venue_id WITH =, during WITH &&);
+ALTER TABLE shows_default ADD CONSTRAINT shows_default_artist_id_during_excl EXCLUDE USING gist (artist_id WITH =, during WITH &&)
+"""
+
+for statement in (SHOW_DURING_FUNCTION, SHOW_DURING_TRIGGER, SHOW_PARTITION_FUNCTION, SHOW_DEFAULT_PARTITION):
+  # DDL formats its statement with %, so literal percent signs are doubled
+  event.listen(Show.__table__, 'after_create', DDL(statement.replace('%', '%%')).execute_if(dialect='postgresql'))
+
+
+# Materialized views are kept out of db.metadata, so create_all and
+# autogenerate leave them to their migrations.
+views = db.MetaData()
+
+# per-venue show aggregates, refreshed by `flask catalog refresh-stats`
+venue_stats = db.Table(
+  'venue_stats', views,
+  db.Column('venue_id', db.Integer, primary_key=True),
+  db.Column('upcoming_shows_count', db.Integer),
+  db.Column('past_shows_count', db.Integer),
+  db.Column('next_show_time', db.DateTime(timezone=True)),
+  db.Column('artists_hosted_count', db.Integer),
+  db.Column('refreshed_at', db.DateTime(timezone=True))
+)
@@ -0,0 +1,42 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from flask import request, abort
+from queries import show_feed, SHOW_FEED_PAGE_SIZE
+
+#----------------------------------------------------------------------------#
+# Query string arguments shared by the pages and the api.
+#----------------------------------------------------------------------------#
+
+
+def genre_args():
+    # ?genre=Jazz&genre=Blues&match=all filters listings by genre
+    genres = request.args.getlist('genre')
+    match = 'all' if request.args.get('match') == 'all' else 'any'
+    return genres, match
+
+
+def show_feed_args():
+    # filters and page of the /shows page and the show feeds
+    args = {
+        'venue_id': request.args.get('venue_id', type=int),
+        'artist_id': request.args.get('artist_id', type=int),
+        'after': request.args.get('after'),
+        'limit': request.args.get('limit', SHOW_FEED_PAGE_SIZE, type=int)
+    }
+    try:
+        for name in ('start', 'end'):
+            value = request.args.get(name)
+            args[name] = datetime.fromisoformat(value) if value else None
+    except ValueError:
+        abort(400)
+    return args
+
+
+def show_feed_page():
+    try:
+        return show_feed(**show_feed_args())
+    except ValueError:
+        abort(400)
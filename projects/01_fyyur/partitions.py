@@ -0,0 +1,68 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import date
+from models import db
+
+#----------------------------------------------------------------------------#
+# Monthly show partitions.
+#----------------------------------------------------------------------------#
+
+# detached partitions are kept here, out of every query on shows
+ARCHIVE_SCHEMA = 'archive'
+
+
+def month_start(day, months=0):
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_month(name):
+    # shows_2026_10 -> date(2026, 10, 1); None for shows_default
+    try:
+        year, month = name.rsplit('_', 2)[1:]
+        return date(int(year), int(month), 1)
+    except ValueError:
+        return None
+
+
+def show_partitions():
+    # (name, month) of the attached monthly partitions, oldest first
+    rows = db.session.execute("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'shows'::regclass
+    """)
+    partitions = [(name, partition_month(name)) for (name,) in rows]
+    return sorted((name, month) for name, month in partitions if month is not None)
+
+
+def create_show_partitions(start, months):
+    # partitions for `months` months from the month of `start`; existing
+    # ones are left alone, rows waiting in shows_default are moved in
+    names = [db.session.execute(
+        'SELECT fyyur_create_show_partition(:month)',
+        {'month': month_start(start, i)}).scalar() for i in range(months)]
+    db.session.commit()
+    return names
+
+
+def archive_show_partitions(before, drop=False):
+    # detach the partitions of months before `before` and move them to the
+    # archive schema (or drop them): queries on shows no longer see them
+    archived = []
+    for name, month in show_partitions():
+        if month >= month_start(before):
+            break
+        db.session.execute('ALTER TABLE shows DETACH PARTITION {}'.format(name))
+        if drop:
+            db.session.execute('DROP TABLE {}'.format(name))
+        else:
+            db.session.execute(
+                'CREATE SCHEMA IF NOT EXISTS {}'.format(ARCHIVE_SCHEMA))
+            db.session.execute('ALTER TABLE {} SET SCHEMA {}'.format(
+                name, ARCHIVE_SCHEMA))
+        archived.append(name)
+    db.session.commit()
+    return archived
@@ -0,0 +1,399 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta, timezone
+from itertools import groupby
+from sqlalchemy import and_, cast, func, tuple_
+from models import db, Venue, Artist, Show, venue_stats
+
+
+def current_time():
+    # shows.start_time is timezone aware, so compare against an aware now
+    return datetime.now(timezone.utc)
+
+
+# past shows listed on the venue and artist pages; the bound on start_time
+# lets the planner prune the shows partitions older than it
+PAST_SHOWS_WINDOW = timedelta(days=365)
+
+
+#----------------------------------------------------------------------------#
+# Genre filters.
+#----------------------------------------------------------------------------#
+
+
+def genre_filter(model, genres, match='any'):
+    # && (any of the genres) or @> (all of them), both answered by the GIN
+    # index on <model>.genres; the cast keeps the operands varchar[]
+    genres = cast(genres, model.genres.type)
+    if match == 'all':
+        return model.genres.op('@>')(genres)
+    return model.genres.op('&&')(genres)
+
+
+def filter_genres(query, model, genres=None, match='any'):
+    if genres:
+        query = query.filter(genre_filter(model, genres, match))
+    return query
+
+
+def genre_facets(model, genres=None, match='any'):
+    # per-genre counts of the (filtered) venues or artists in one aggregate
+    genre = func.unnest(model.genres).label('genre')
+    matches = filter_genres(
+        db.session.query(genre), model, genres, match).subquery()
+    total = func.count().label('total')
+    return db.session.query(matches.c.genre, total).group_by(
+        matches.c.genre).order_by(total.desc(), matches.c.genre).all()
+
+
+#----------------------------------------------------------------------------#
+# Venue directory.
+#----------------------------------------------------------------------------#
+
+# rows fetched per round trip while streaming the directory
+DIRECTORY_BATCH_SIZE = 1000
+
+
+def venue_directory_query(genres=None, match='any'):
+    # every venue with its city/state and the number of upcoming shows read
+    # from the venue_stats view, ordered so that venues of the same area are
+    # adjacent. Venues added since the last refresh count 0 upcoming shows
+    query = db.session.query(
+        Venue.city.label('city'),
+        Venue.state.label('state'),
+        Venue.id.label('id'),
+        Venue.name.label('name'),
+        func.coalesce(venue_stats.c.upcoming_shows_count, 0).label(
+            'num_upcoming_shows')).outerjoin(
+        venue_stats, venue_stats.c.venue_id == Venue.id).order_by(
+        Venue.state, Venue.city, Venue.name, Venue.id)
+    return filter_genres(query, Venue, genres, match)
+
+
+def venue_directory(genres=None, match='any'):
+    # yields one area at a time so the template can be streamed while the
+    # remaining rows are still being fetched
+    rows = venue_directory_query(genres, match).yield_per(
+        DIRECTORY_BATCH_SIZE)
+    for (city, state), venues in groupby(rows, key=lambda x: (x.city, x.state)):
+        yield {
+            'city': city,
+            'state': state,
+            'venues': [{
+                'id': venue.id,
+                'name': venue.name,
+                'num_upcoming_shows': venue.num_upcoming_shows
+            } for venue in venues]
+        }
+
+
+def artist_directory(genres=None, match='any'):
+    query = db.session.query(
+        Artist.id.label('id'),
+        Artist.name.label('name')).order_by(Artist.name, Artist.id)
+    return filter_genres(query, Artist, genres, match).yield_per(
+        DIRECTORY_BATCH_SIZE)
+
+
+#----------------------------------------------------------------------------#
+# Availability.
+#----------------------------------------------------------------------------#
+
+
+def booked_ranges(owner_column, owner_id, start, end):
+    # [lower, upper) of the bookings overlapping [start, end), ordered; the
+    # GiST index behind the (owner, during) exclusion constraint answers it
+    return db.session.query(func.lower(Show.during), func.upper(Show.during)).filter(
+        owner_column == owner_id,
+        Show.during.op('&&')(func.tstzrange(start, end))).order_by(
+        func.lower(Show.during)).all()
+
+
+def free_slots(booked, start, end, min_minutes=0):
+    # the gaps between ordered bookings within [start, end)
+    slots = []
+    free_from = start
+    for lower, upper in booked:
+        if lower > free_from:
+            slots.append((free_from, min(lower, end)))
+        free_from = max(free_from, upper)
+    if free_from < end:
+        slots.append((free_from, end))
+    minimum = timedelta(minutes=min_minutes)
+    return [(lower, upper) for lower, upper in slots if upper - lower >= minimum]
+
+
+def venue_availability(venue_id, start, end, min_minutes=0):
+    booked = booked_ranges(Show.venue_id, venue_id, start, end)
+    return {
+        'booked': booked,
+        'free': free_slots(booked, start, end, min_minutes)
+    }
+
+
+#----------------------------------------------------------------------------#
+# Past / upcoming shows.
+#----------------------------------------------------------------------------#
+
+
+def show_timeline(query, owner_column, owner_id, now=None):
+    # split the shows of one artist or venue into past (within
+    # PAST_SHOWS_WINDOW) and upcoming with range predicates on start_time,
+    # served by the (owner, start_time) indexes of the unpruned partitions
+    if now is None:
+        now = current_time()
+
+    since = now - PAST_SHOWS_WINDOW
+    query = query.filter(owner_column == owner_id, Show.start_time >= since)
+    upcoming_shows = query.filter(Show.start_time >= now).order_by(
+        Show.start_time, Show.id).all()
+    past_shows = query.filter(Show.start_time < now).order_by(
+        Show.start_time.desc(), Show.id.desc()).all()
+
+    return {
+        'past_shows': past_shows,
+        'upcoming_shows': upcoming_shows,
+        'past_shows_count': len(past_shows),
+        'upcoming_shows_count': len(upcoming_shows)
+    }
+
+
+def artist_shows(artist_id, now=None):
+    query = db.session.query(
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Venue.image_link.label('venue_image_link'),
+        Show.start_time.label('start_time')).join(
+        Show, Show.venue_id == Venue.id)
+    return show_timeline(query, Show.artist_id, artist_id, now)
+
+
+#----------------------------------------------------------------------------#
+# Show feed.
+#----------------------------------------------------------------------------#
+
+SHOW_FEED_PAGE_SIZE = 30
+SHOW_FEED_MAX_PAGE_SIZE = 100
+
+
+def encode_feed_cursor(start_time, show_id):
+    return '{}_{}'.format(start_time.isoformat(), show_id)
+
+
+def decode_feed_cursor(cursor):
+    # raises ValueError on a malformed cursor
+    start_time, _, show_id = cursor.rpartition('_')
+    return datetime.fromisoformat(start_time), int(show_id)
+
+
+def show_feed_query(after=None, start=None, end=None, venue_id=None,
+                    artist_id=None):
+    # shows with their venue name and artist name/image in feed order
+    query = db.session.query(
+        Show.id.label('id'),
+        Show.start_time.label('start_time'),
+        Venue.id.label('venue_id'),
+        Venue.name.label('venue_name'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')).join(
+        Venue, Venue.id == Show.venue_id).join(
+        Artist, Artist.id == Show.artist_id)
+
+    if start is not None:
+        query = query.filter(Show.start_time >= start)
+    if end is not None:
+        query = query.filter(Show.start_time < end)
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if after is not None:
+        query = query.filter(
+            tuple_(Show.start_time, Show.id) > tuple_(*decode_feed_cursor(after)))
+    return query.order_by(Show.start_time, Show.id)
+
+
+def show_feed(after=None, start=None, end=None, venue_id=None,
+              artist_id=None, limit=SHOW_FEED_PAGE_SIZE):
+    # one joined query per page, keyset paginated on (start_time, id) so a
+    # page costs the same no matter how deep into the feed it is
+    query = show_feed_query(after, start, end, venue_id, artist_id)
+    limit = max(1, min(limit, SHOW_FEED_MAX_PAGE_SIZE))
+    shows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(shows) > limit:
+        shows = shows[:limit]
+        next_cursor = encode_feed_cursor(shows[-1].start_time, shows[-1].id)
+
+    return shows, next_cursor
+
+
+#----------------------------------------------------------------------------#
+# Venue detail.
+#----------------------------------------------------------------------------#
+
+
+def venue_detail(venue_id, now=None):
+    # the venue page from one query: the venue columns and its venue_stats
+    # aggregates repeated on every show row (or once, with null show columns,
+    # for a venue without shows), ordered by start time and flagged upcoming
+    # on the database side. The show counts come from the listed rows, which
+    # are read anyway and are never stale. Past shows are those of the last
+    # PAST_SHOWS_WINDOW, so older partitions are pruned
+    if now is None:
+        now = current_time()
+
+    rows = db.session.query(
+        Venue,
+        venue_stats.c.artists_hosted_count.label('artists_hosted_count'),
+        venue_stats.c.refreshed_at.label('stats_refreshed_at'),
+        Show.start_time.label('start_time'),
+        (Show.start_time >= now).label('upcoming'),
+        Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link')).outerjoin(
+        venue_stats, venue_stats.c.venue_id == Venue.id).outerjoin(
+        Show, and_(Show.venue_id == Venue.id,
+                   Show.start_time >= now - PAST_SHOWS_WINDOW)).outerjoin(
+        Artist, Artist.id == Show.artist_id).filter(
+        Venue.id == venue_id).order_by(
+        Show.start_time, Show.id).all()
+
+    if not rows:
+        return None
+
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        if row.start_time is None:
+            continue
+        show = {
+            'artist_id': row.artist_id,
+            'artist_name': row.artist_name,
+            'artist_image_link': row.artist_image_link,
+            'start_time': row.start_time
+        }
+        if row.upcoming:
+            upcoming_shows.append(show)
+        else:
+            past_shows.append(show)
+    past_shows.reverse()
+
+    data = rows[0].Venue.format()
+    data.update({
+        'artists_hosted_count': rows[0].artists_hosted_count,
+        'stats_refreshed_at': rows[0].stats_refreshed_at,
+        'past_shows': past_shows,
+        'upcoming_shows': upcoming_shows,
+        'past_shows_count': len(past_shows),
+        'upcoming_shows_count': len(upcoming_shows)
+    })
+    return data
+
+
+#----------------------------------------------------------------------------#
+# Artist detail.
+#----------------------------------------------------------------------------#
+
+
+def artist_detail(artist_id, now=None):
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        return None
+
+    data = {
+        'id': artist.id,
+        'name': artist.name,
+        'genres': artist.genres,
+        'city': artist.city,
+        'state': artist.state,
+        'phone': artist.phone,
+        'website': artist.website,
+        'facebook_link': artist.facebook_link,
+        'seeking_venue': artist.seeking_venue,
+        'seeking_description': artist.seeking_description,
+        'image_link': artist.image_link
+    }
+    # past and upcoming shows are read with range predicates on start_time,
+    # so only the rows shown on the page are fetched
+    data.update(artist_shows(artist_id, now))
+    return data
+
+
+#----------------------------------------------------------------------------#
+# Watermarks.
+#----------------------------------------------------------------------------#
+
+# One aggregate row per page that changes whenever the page would: versions
+# and updated_at maxima catch edits, counts catch deletes, and the upcoming
+# count catches shows moving into the past. Used as the source of ETags.
+
+
+def venue_list_watermark(genres=None, match='any'):
+    query = db.session.query(
+        func.count(Venue.id),
+        func.max(Venue.updated_at),
+        func.max(venue_stats.c.refreshed_at)).outerjoin(
+        venue_stats, venue_stats.c.venue_id == Venue.id)
+    return tuple(filter_genres(query, Venue, genres, match).one())
+
+
+def artist_list_watermark(genres=None, match='any'):
+    query = db.session.query(func.count(Artist.id), func.max(Artist.updated_at))
+    return tuple(filter_genres(query, Artist, genres, match).one())
+
+
+def detail_watermark(model, owner_column, other, other_column, owner_id, now):
+    # the record's version, then its shows in the past shows window and the
+    # latest change to the records listed with them; None for an unknown id
+    row = db.session.query(
+        model.version,
+        func.count(Show.id),
+        func.count(Show.id).filter(Show.start_time >= now),
+        func.max(Show.updated_at),
+        func.max(other.updated_at)).outerjoin(
+        Show, and_(owner_column == model.id,
+                   Show.start_time >= now - PAST_SHOWS_WINDOW)).outerjoin(
+        other, other.id == other_column).filter(
+        model.id == owner_id).group_by(model.id).first()
+    return tuple(row) if row is not None else None
+
+
+def venue_watermark(venue_id, now=None):
+    # venue_detail also shows the venue_stats aggregates
+    if now is None:
+        now = current_time()
+    watermark = detail_watermark(
+        Venue, Show.venue_id, Artist, Show.artist_id, venue_id, now)
+    if watermark is None:
+        return None
+    refreshed_at = db.session.query(venue_stats.c.refreshed_at).filter(
+        venue_stats.c.venue_id == venue_id).scalar()
+    return watermark + (refreshed_at,)
+
+
+def artist_watermark(artist_id, now=None):
+    if now is None:
+        now = current_time()
+    return detail_watermark(
+        Artist, Show.artist_id, Venue, Show.venue_id, artist_id, now)
+
+
+def show_feed_watermark(after=None, start=None, end=None, venue_id=None,
+                        artist_id=None, limit=SHOW_FEED_PAGE_SIZE):
+    # the same page as show_feed, aggregated instead of fetched: the show
+    # ids on it (plus the one that decides next_cursor) and latest changes
+    limit = max(1, min(limit, SHOW_FEED_MAX_PAGE_SIZE))
+    page = show_feed_query(after, start, end, venue_id, artist_id).add_columns(
+        Show.updated_at.label('show_updated_at'),
+        Venue.updated_at.label('venue_updated_at'),
+        Artist.updated_at.label('artist_updated_at')).limit(limit + 1).subquery()
+    return tuple(db.session.query(
+        func.array_agg(page.c.id),
+        func.max(page.c.show_updated_at),
+        func.max(page.c.venue_updated_at),
+        func.max(page.c.artist_updated_at)).one())
@@ -0,0 +1,152 @@
+#----------------------------------------------------------------------------#
+# Shared by projects/01_fyyur, projects/02_trivia_api/backend and
+# projects/capstone, which are each deployed from their own directory.
+# The three copies must stay identical: change them together and check with
+#   cmp projects/01_fyyur/querycount.py projects/capstone/querycount.py
+#   cmp projects/01_fyyur/querycount.py projects/02_trivia_api/backend/querycount.py
+#----------------------------------------------------------------------------#
+
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import time
+import threading
+from contextlib import contextmanager
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#----------------------------------------------------------------------------#
+# Query counting, N+1 detection and slow query plans.
+#----------------------------------------------------------------------------#
+
+# defaults, overridden by the app config keys of the same name
+SLOW_QUERY_SECONDS = 0.1
+N_PLUS_ONE_THRESHOLD = 3
+
+budgets = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryRecorder:
+    # the statements run while it is active, with their parameters and time
+
+    def __init__(self, slow_seconds=None):
+        self.slow_seconds = slow_seconds
+        self.queries = []
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        # statements run `threshold` or more times with different parameters,
+        # the shape of a lazy load inside a loop
+        parameters = {}
+        for statement, params, _ in self.queries:
+            parameters.setdefault(statement, set()).add(repr(params))
+        return {statement: len(params) for statement, params in parameters.items()
+                if len(params) >= threshold}
+
+    def report(self):
+        return '\n'.join('{:8.1f} ms  {}'.format(seconds * 1000, ' '.join(statement.split()))
+                         for statement, _, seconds in self.queries)
+
+
+def active_recorders():
+    recorders = list(getattr(budgets, 'recorders', ()))
+    if has_request_context() and 'query_recorder' in g:
+        recorders.append(g.query_recorder)
+    return recorders
+
+
+def explain(conn, statement, parameters):
+    # a fresh DBAPI cursor, so the plan query is not itself recorded
+    if conn.dialect.name != 'postgresql':
+        return None
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute('EXPLAIN ' + statement, parameters)
+        return '\n'.join(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_started'] = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    recorders = active_recorders()
+    if not recorders:
+        return
+    seconds = time.perf_counter() - conn.info.pop('query_started', time.perf_counter())
+    for recorder in recorders:
+        recorder.queries.append((statement, parameters, seconds))
+
+    recorder = g.get('query_recorder') if has_request_context() else None
+    if (recorder is not None and recorder.slow_seconds is not None
+            and seconds >= recorder.slow_seconds and not executemany
+            and statement.lstrip()[:6].upper() == 'SELECT'):
+        current_app.logger.warning(
+            'slow query in %s (%.1f ms): %s\n%s', request.endpoint,
+            seconds * 1000, statement, explain(conn, statement, parameters) or '')
+
+
+@contextmanager
+def query_budget(max_queries):
+    # fails the block when it runs more than `max_queries` statements:
+    #   with query_budget(1):
+    #       client.get('/venues/1')
+    recorder = QueryRecorder()
+    stack = budgets.__dict__.setdefault('recorders', [])
+    stack.append(recorder)
+    try:
+        yield recorder
+    finally:
+        stack.remove(recorder)
+    if len(recorder) > max_queries:
+        raise QueryBudgetExceeded('{} queries, budget {}:\n{}'.format(
+            len(recorder), max_queries, recorder.report()))
+
+
+def setup_query_instrumentation(app):
+    # on in debug and testing, or with QUERY_INSTRUMENTATION. Statements run
+    # while a streamed response is sent come after after_request and are
+    # not counted against the request
+
+    def enabled():
+        return app.config.get('QUERY_INSTRUMENTATION', app.debug or app.testing)
+
+    @app.before_request
+    def start_query_recorder():
+        if enabled():
+            g.query_recorder = QueryRecorder(
+                app.config.get('SLOW_QUERY_SECONDS', SLOW_QUERY_SECONDS))
+
+    @app.after_request
+    def check_query_recorder(response):
+        recorder = g.pop('query_recorder', None)
+        if recorder is None:
+            return response
+        response.headers['X-Query-Count'] = str(len(recorder))
+
+        threshold = app.config.get('N_PLUS_ONE_THRESHOLD', N_PLUS_ONE_THRESHOLD)
+        for statement, count in recorder.repeated(threshold).items():
+            app.logger.warning('possible N+1 in %s, %d runs of: %s',
+                               request.endpoint, count, statement)
+
+        # QUERY_BUDGETS = {'endpoint': max queries}; a failure under test
+        budget = app.config.get('QUERY_BUDGETS', {}).get(request.endpoint)
+        if budget is not None and len(recorder) > budget:
+            message = '{} ran {} queries, budget {}:\n{}'.format(
+                request.endpoint, len(recorder), budget, recorder.report())
+            if app.testing:
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+        return response
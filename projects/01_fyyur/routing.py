@@ -0,0 +1,111 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import time
+import random
+from flask import g, request, session, has_request_context
+from flask_sqlalchemy import SQLAlchemy, SignallingSession
+from sqlalchemy import orm, exc
+
+#----------------------------------------------------------------------------#
+# Read replica routing.
+#----------------------------------------------------------------------------#
+
+REPLICA_BIND_PREFIX = 'replica_'
+# session key holding the time until which reads stay on the primary
+STICKY_KEY = 'read_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# bind key -> (healthy, checked at), per worker process
+replica_health = {}
+
+
+def replica_binds(config):
+    return sorted(key for key in (config.get('SQLALCHEMY_BINDS') or {})
+                  if key.startswith(REPLICA_BIND_PREFIX))
+
+
+def replica_healthy(db, app, bind):
+    # a replica that refused a connection is skipped for
+    # REPLICA_RETRY_SECONDS, during which its reads go to the primary
+    healthy, checked_at = replica_health.get(bind, (True, None))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < app.config.get(
+            'REPLICA_RETRY_SECONDS', 10):
+        return healthy
+    try:
+        db.get_engine(app, bind=bind).connect().close()
+        healthy = True
+    except exc.DBAPIError:
+        healthy = False
+        app.logger.warning('replica %s is unreachable, reading from the primary', bind)
+    replica_health[bind] = (healthy, now)
+    return healthy
+
+
+def pick_replica(db, app):
+    binds = [bind for bind in replica_binds(app.config)
+             if replica_healthy(db, app, bind)]
+    return random.choice(binds) if binds else None
+
+
+def reading_own_writes():
+    # the client wrote in the last REPLICA_STICKY_SECONDS, so its reads go
+    # to the primary
+    return has_request_context() and session.get(STICKY_KEY, 0) > time.time()
+
+
+def read_from_replica():
+    # whether the reads of the current request went to a replica
+    return has_request_context() and bool(g.get('read_replica_engine'))
+
+
+class RoutingSession(SignallingSession):
+    # reads of a request routed to a replica go to one of the replica binds;
+    # flushes, and everything outside such requests, go to the primary
+
+    def __init__(self, db, **options):
+        self.db = db
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_request_context() and g.get('read_replica'):
+            engine = g.get('read_replica_engine')
+            if engine is None:
+                bind = pick_replica(self.db, self.app)
+                engine = self.db.get_engine(self.app, bind=bind) if bind else False
+                g.read_replica_engine = engine
+            if engine:
+                return engine
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def setup_read_routing(app):
+    # GET requests read from a replica, unless the client wrote something in
+    # the last REPLICA_STICKY_SECONDS: then it reads its own writes from the
+    # primary until the replicas have caught up
+
+    @app.before_request
+    def route_reads():
+        if request.method not in SAFE_METHODS or not replica_binds(app.config):
+            return
+        until = session.get(STICKY_KEY)
+        if until is not None:
+            if until > time.time():
+                return
+            session.pop(STICKY_KEY)
+        g.read_replica = True
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method not in SAFE_METHODS and replica_binds(app.config):
+            session[STICKY_KEY] = time.time() + app.config.get(
+                'REPLICA_STICKY_SECONDS', 5)
+        return response
@@ -0,0 +1,180 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from markupsafe import Markup, escape
+from sqlalchemy import func, literal, or_, union_all
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Name search.
+#----------------------------------------------------------------------------#
+
+SEARCH_PAGE_SIZE = 20
+# searches never rank or count more than this many matches
+SEARCH_MAX_RESULTS = 200
+
+
+def is_postgresql():
+    return db.engine.dialect.name == 'postgresql'
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def trigram_name_query(model, term):
+    # pg_trgm: substring matches and misspelt names both use the GIN trigram
+    # index on <model>.name, ranked by the closer of whole-name and
+    # best-word similarity. Custom operators reach psycopg2's pyformat
+    # paramstyle unescaped, so their percent signs are doubled
+    score = func.greatest(
+        func.similarity(model.name, term),
+        func.word_similarity(term, model.name))
+    return db.session.query(
+        model.id.label('id'),
+        model.name.label('name'),
+        score.label('score')).filter(or_(
+            model.name.ilike('%{}%'.format(escape_like(term)), escape='\\'),
+            model.name.op('%%')(term),
+            literal(term).op('<%%')(model.name))).order_by(
+        score.desc(), model.name, model.id)
+
+
+def like_name_query(model, term):
+    # stand-in for databases without pg_trgm (sqlite in tests): plain
+    # case-insensitive substring match ordered by name
+    return db.session.query(
+        model.id.label('id'),
+        model.name.label('name'),
+        literal(1.0).label('score')).filter(
+        func.lower(model.name).like(
+            '%{}%'.format(escape_like(term.lower())), escape='\\')).order_by(
+        model.name, model.id)
+
+
+def search_names(model, term, page=1, per_page=SEARCH_PAGE_SIZE):
+    term = term.strip()
+    if is_postgresql():
+        query = trigram_name_query(model, term)
+    else:
+        query = like_name_query(model, term)
+
+    page = max(page, 1)
+    offset = (page - 1) * per_page
+    count = query.limit(SEARCH_MAX_RESULTS).count()
+    data = []
+    if offset < count:
+        data = query.offset(offset).limit(
+            min(per_page, SEARCH_MAX_RESULTS - offset)).all()
+
+    return {
+        'count': count,
+        'data': data,
+        'page': page,
+        'has_next': offset + len(data) < count
+    }
+
+
+#----------------------------------------------------------------------------#
+# Full-text search.
+#----------------------------------------------------------------------------#
+
+# venues.search_document / artists.search_document are maintained by the
+# fyyur_search_document_update trigger with this configuration
+SEARCH_CONFIG = 'english'
+# private use characters mark the highlighted words until the snippet is
+# escaped, so user text can never inject markup
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_STOP = '\ue001'
+HEADLINE_OPTIONS = ('StartSel={}, StopSel={}, MaxFragments=2, '
+                    'MaxWords=20, MinWords=5').format(
+    HIGHLIGHT_START, HIGHLIGHT_STOP)
+
+
+def document_text(model):
+    return func.concat_ws(
+        ' ', model.name, model.city, model.state,
+        func.array_to_string(model.genres, ' '), model.seeking_description)
+
+
+def fulltext_select(model, kind, tsquery):
+    return db.select([
+        literal(kind).label('kind'),
+        model.id.label('id'),
+        model.name.label('name'),
+        func.ts_rank_cd(model.search_document, tsquery).label('rank'),
+        document_text(model).label('document')
+    ]).where(model.search_document.op('@@')(tsquery))
+
+
+def fulltext_query(term, offset, limit):
+    # one query over both tables: the GIN indexes on search_document find
+    # the matches, which are ranked and cut to a page before the (costly)
+    # headlines are built
+    tsquery = func.websearch_to_tsquery(SEARCH_CONFIG, term)
+    matches = union_all(
+        fulltext_select(Venue, 'venue', tsquery),
+        fulltext_select(Artist, 'artist', tsquery)).alias('matches')
+    page = db.select([matches]).order_by(
+        matches.c.rank.desc(), matches.c.name, matches.c.kind,
+        matches.c.id).offset(offset).limit(limit).alias('page')
+    return db.session.query(
+        page.c.kind,
+        page.c.id,
+        page.c.name,
+        page.c.rank,
+        func.ts_headline(
+            SEARCH_CONFIG, page.c.document, tsquery,
+            HEADLINE_OPTIONS).label('snippet')).order_by(
+        page.c.rank.desc(), page.c.name, page.c.kind, page.c.id)
+
+
+def fallback_query(term, offset, limit):
+    # stand-in for databases without full-text search: name matches only
+    matches = union_all(
+        like_name_query(Venue, term).order_by(None).add_columns(
+            literal('venue').label('kind')).statement,
+        like_name_query(Artist, term).order_by(None).add_columns(
+            literal('artist').label('kind')).statement).alias('matches')
+    return db.session.query(
+        matches.c.kind,
+        matches.c.id,
+        matches.c.name,
+        matches.c.score.label('rank'),
+        matches.c.name.label('snippet')).order_by(
+        matches.c.name, matches.c.kind, matches.c.id).offset(
+        offset).limit(limit)
+
+
+def highlight(snippet):
+    return escape(snippet).replace(
+        HIGHLIGHT_START, Markup('<mark>')).replace(
+        HIGHLIGHT_STOP, Markup('</mark>'))
+
+
+def search_catalog(term, page=1, per_page=SEARCH_PAGE_SIZE):
+    term = term.strip()
+    page = max(page, 1)
+    offset = (page - 1) * per_page
+    if not term or offset >= SEARCH_MAX_RESULTS:
+        return {'data': [], 'page': page, 'has_next': False}
+
+    limit = min(per_page, SEARCH_MAX_RESULTS - offset)
+    if is_postgresql():
+        query = fulltext_query(term, offset, limit + 1)
+    else:
+        query = fallback_query(term, offset, limit + 1)
+    rows = query.all()
+
+    return {
+        'data': [{
+            'kind': row.kind,
+            'id': row.id,
+            'name': row.name,
+            'rank': row.rank,
+            'snippet': highlight(row.snippet)
+        } for row in rows[:limit]],
+        'page': page,
+        'has_next': len(rows) > limit
+    }
@@ -2,3 +2,31 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+
+// type-ahead suggestions for the navbar search boxes
+document.querySelectorAll('input[list="search-suggestions"]').forEach(function(input) {
+  var datalist = document.getElementById('search-suggestions');
+  input.addEventListener('input', function() {
+    var term = input.value;
+    if (!term) {
+      return;
+    }
+    fetch('/search/suggest?q=' + encodeURIComponent(term))
+      .then(function(response) { return response.json(); })
+      .then(function(data) {
+        if (input.value !== term) {
+          return;
+        }
+        datalist.innerHTML = '';
+        data.suggestions.forEach(function(suggestion) {
+          var option = document.createElement('option');
+          option.value = suggestion.name;
+          datalist.appendChild(option);
+        });
+      })
+      .catch(function(e) {
+        console.log('error', e)
+      });
+  });
+});
@@ -0,0 +1,46 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from models import db, without_statement_timeout
+
+#----------------------------------------------------------------------------#
+# Venue statistics view.
+#----------------------------------------------------------------------------#
+
+# same definition as migration 2ac7f4b66792, for databases built with
+# create_all (tests)
+VENUE_STATS_VIEW = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS venue_stats AS
+SELECT venues.id AS venue_id,
+       count(shows.id) FILTER (WHERE shows.start_time >= now())::integer AS upcoming_shows_count,
+       count(shows.id) FILTER (WHERE shows.start_time < now())::integer AS past_shows_count,
+       min(shows.start_time) FILTER (WHERE shows.start_time >= now()) AS next_show_time,
+       count(DISTINCT shows.artist_id)::integer AS artists_hosted_count,
+       now() AS refreshed_at
+FROM venues LEFT JOIN shows ON shows.venue_id = venues.id
+GROUP BY venues.id
+"""
+VENUE_STATS_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS ix_venue_stats_venue_id ON venue_stats (venue_id)
+"""
+
+
+def create_venue_stats():
+    db.session.execute(VENUE_STATS_VIEW)
+    db.session.execute(VENUE_STATS_INDEX)
+    db.session.commit()
+
+
+def drop_venue_stats():
+    db.session.execute('DROP MATERIALIZED VIEW IF EXISTS venue_stats')
+    db.session.commit()
+
+
+def refresh_venue_stats(concurrently=True):
+    # CONCURRENTLY (possible thanks to the unique index) keeps the view
+    # readable while it is rebuilt
+    without_statement_timeout()
+    db.session.execute('REFRESH MATERIALIZED VIEW {}venue_stats'.format(
+        'CONCURRENTLY ' if concurrently else ''))
+    db.session.commit()
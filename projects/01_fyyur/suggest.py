@@ -0,0 +1,226 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import sys
+import time
+import threading
+from bisect import bisect_left, insort
+from datetime import timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from models import db, Venue, Artist
+
+#----------------------------------------------------------------------------#
+# Prefix index.
+#----------------------------------------------------------------------------#
+
+SUGGEST_LIMIT = 10
+# seconds between a worker's checks of the catalog for changes
+SUGGEST_REFRESH_SECONDS = 30
+# records committed this long after their updated_at (the start of their
+# transaction) are still picked up
+SUGGEST_REFRESH_OVERLAP = timedelta(minutes=1)
+# more changed records than this are cheaper to load with a rebuild
+SUGGEST_REBUILD_THRESHOLD = 1000
+SUGGEST_MODELS = (('venue', Venue), ('artist', Artist))
+
+
+def fold(text):
+    return ' '.join(text.casefold().split())
+
+
+def name_keys(name):
+    # every word of a name starts a key, so "hop" suggests "The Musical Hop"
+    words = fold(name).split(' ')
+    return {' '.join(words[i:]) for i in range(len(words)) if words[i]}
+
+
+class PrefixIndex:
+    # sorted array of (key, kind, id) answered with bisect; a lookup is a
+    # binary search plus a short forward scan over the matching keys
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+        self.names = {}
+        self.counts = {}
+
+    def build(self, records):
+        # records: iterable of (kind, id, name)
+        names = {}
+        entries = []
+        counts = {}
+        for kind, id, name in records:
+            if (kind, id) not in names:
+                counts[kind] = counts.get(kind, 0) + 1
+            names[(kind, id)] = name
+            entries.extend((key, kind, id) for key in name_keys(name))
+        entries.sort()
+        with self.lock:
+            self.entries = entries
+            self.names = names
+            self.counts = counts
+
+    def add(self, kind, id, name):
+        # also used on edits: the previous name of the record is replaced
+        with self.lock:
+            if self.names.get((kind, id)) == name:
+                return
+            self._remove(kind, id)
+            self.names[(kind, id)] = name
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            for key in name_keys(name):
+                insort(self.entries, (key, kind, id))
+
+    def remove(self, kind, id):
+        with self.lock:
+            self._remove(kind, id)
+
+    def _remove(self, kind, id):
+        name = self.names.pop((kind, id), None)
+        if name is None:
+            return
+        self.counts[kind] -= 1
+        for key in name_keys(name):
+            i = bisect_left(self.entries, (key, kind, id))
+            if i < len(self.entries) and self.entries[i] == (key, kind, id):
+                del self.entries[i]
+
+    def suggest(self, prefix, limit=SUGGEST_LIMIT):
+        prefix = fold(prefix)
+        if not prefix:
+            return []
+
+        results = []
+        seen = set()
+        with self.lock:
+            entries = self.entries
+            i = bisect_left(entries, (prefix,))
+            while (i < len(entries) and len(results) < limit and
+                   entries[i][0].startswith(prefix)):
+                _, kind, id = entries[i]
+                if (kind, id) not in seen:
+                    seen.add((kind, id))
+                    results.append({
+                        'kind': kind,
+                        'id': id,
+                        'name': self.names[(kind, id)]
+                    })
+                i += 1
+        return results
+
+    def __len__(self):
+        return len(self.names)
+
+    def count(self, kind):
+        return self.counts.get(kind, 0)
+
+    def memory_footprint(self):
+        # bytes held by the index: the arrays, their tuples and the strings
+        with self.lock:
+            size = sys.getsizeof(self.entries) + sys.getsizeof(self.names)
+            keys = set()
+            for entry in self.entries:
+                size += sys.getsizeof(entry)
+                if entry[0] not in keys:
+                    keys.add(entry[0])
+                    size += sys.getsizeof(entry[0])
+            for record, name in self.names.items():
+                size += sys.getsizeof(record) + sys.getsizeof(name)
+        return size
+
+
+# one index per worker process. Every worker (and `flask catalog` command)
+# writes to the database, so each worker polls it for changes: records
+# added or renamed since its last check are applied in place, and a count
+# lower than the index's means records were deleted, which a rebuild drops
+suggestions = PrefixIndex()
+
+
+class RefreshState:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = None
+        # latest updated_at seen at the last check
+        self.watermark = None
+
+
+refresh_state = RefreshState()
+
+
+def catalog_names(since=None):
+    for kind, model in SUGGEST_MODELS:
+        query = db.session.query(model.id, model.name)
+        if since is not None:
+            query = query.filter(model.updated_at >= since)
+        for id, name in query.yield_per(1000):
+            yield kind, id, name
+
+
+def catalog_state():
+    # the number of records of each kind and the latest change to any
+    counts = {}
+    latest = None
+    for kind, model in SUGGEST_MODELS:
+        counts[kind], updated_at = db.session.query(
+            func.count(model.id), func.max(model.updated_at)).one()
+        if updated_at is not None and (latest is None or updated_at > latest):
+            latest = updated_at
+    return counts, latest
+
+
+def build_suggestions():
+    _, refresh_state.watermark = catalog_state()
+    suggestions.build(catalog_names())
+
+
+def setup_suggestions(app):
+    # build the index at boot, so the first keystroke after a worker starts
+    # does not wait for it; when the database cannot be read yet it is built
+    # by the first /search/suggest instead
+    if not app.config.get('SUGGEST_WARMUP'):
+        return
+    started = time.perf_counter()
+    try:
+        with app.app_context():
+            build_suggestions()
+    except SQLAlchemyError as e:
+        app.logger.warning('suggestion index not built at boot: %s', e)
+        return
+    refresh_state.checked_at = time.monotonic()
+    app.logger.debug('built the suggestion index in %.1f ms',
+                     (time.perf_counter() - started) * 1000)
+
+
+def apply_catalog_changes():
+    counts, latest = catalog_state()
+    if refresh_state.watermark is None:
+        changed = None
+    else:
+        changed = list(catalog_names(refresh_state.watermark - SUGGEST_REFRESH_OVERLAP))
+    if changed is None or len(changed) > SUGGEST_REBUILD_THRESHOLD:
+        suggestions.build(catalog_names())
+    else:
+        for kind, id, name in changed:
+            suggestions.add(kind, id, name)
+        if any(suggestions.count(kind) != count for kind, count in counts.items()):
+            suggestions.build(catalog_names())
+    refresh_state.watermark = latest
+
+
+def refresh_suggestions(interval=SUGGEST_REFRESH_SECONDS):
+    # called before the index is read; one request per `interval` seconds
+    # checks for changes while the others keep reading the current index
+    now = time.monotonic()
+    with refresh_state.lock:
+        if (refresh_state.checked_at is not None and
+                now - refresh_state.checked_at < interval):
+            return
+        previous, refresh_state.checked_at = refresh_state.checked_at, now
+    try:
+        apply_catalog_changes()
+    except BaseException:
+        refresh_state.checked_at = previous
+        raise
@@ -0,0 +1,183 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, time, timedelta, timezone
+from itertools import accumulate
+from forms import VenueForm
+
+#----------------------------------------------------------------------------#
+# Synthetic catalog data.
+#----------------------------------------------------------------------------#
+
+# Venues and artists spread over cities by population, with skewed genres,
+# and shows whose venues and artists follow a Zipf popularity curve: a few
+# of them get most of the bookings, as in real listings. All generators take
+# a random.Random so a seed reproduces the same catalog.
+
+# (city, state, relative population)
+CITIES = (
+    ('New York', 'NY', 83), ('Los Angeles', 'CA', 39), ('Chicago', 'IL', 27),
+    ('Houston', 'TX', 23), ('Phoenix', 'AZ', 16), ('Philadelphia', 'PA', 16),
+    ('San Antonio', 'TX', 15), ('San Diego', 'CA', 14), ('Dallas', 'TX', 13),
+    ('Austin', 'TX', 10), ('San Francisco', 'CA', 9), ('Seattle', 'WA', 7),
+    ('Denver', 'CO', 7), ('Nashville', 'TN', 7), ('Boston', 'MA', 7),
+    ('Portland', 'OR', 6), ('Las Vegas', 'NV', 6), ('Detroit', 'MI', 6),
+    ('Memphis', 'TN', 6), ('Atlanta', 'GA', 5), ('Kansas City', 'MO', 5),
+    ('Miami', 'FL', 4), ('Minneapolis', 'MN', 4), ('New Orleans', 'LA', 4),
+    ('Oakland', 'CA', 4)
+)
+GENRES = [value for value, _ in VenueForm.genres.kwargs['choices']]
+# relative popularity, the genres not listed weigh 1
+GENRE_WEIGHTS = {'Rock n Roll': 8, 'Pop': 7, 'Hip-Hop': 6, 'Jazz': 5,
+                 'Electronic': 5, 'R&B': 4, 'Country': 4, 'Alternative': 4,
+                 'Folk': 3, 'Blues': 3, 'Soul': 3, 'Punk': 2, 'Classical': 2}
+
+VENUE_WORDS = (
+    ('The', 'Blue', 'Velvet', 'Golden', 'Red', 'Old', 'Electric', 'Silver',
+     'Crimson', 'Lucky', 'Rusty', 'Midnight', 'Grand', 'Little', 'Royal'),
+    ('Note', 'Lounge', 'Hall', 'Room', 'Garden', 'Cellar', 'Loft', 'Stage',
+     'Tavern', 'Theatre', 'Ballroom', 'Club', 'Warehouse', 'Arena', 'Saloon'))
+STREETS = ('Main', 'Market', 'Mission', 'Broadway', 'Valencia', 'Elm', 'Oak',
+           'Maple', 'Pine', 'Cedar', 'Church', 'Water', 'Union', 'Park')
+ARTIST_WORDS = (
+    ('Wild', 'Electric', 'Quiet', 'Neon', 'Broken', 'Velvet', 'Lonesome',
+     'Brass', 'Paper', 'Static', 'Howling', 'Sunday', 'Crystal', 'Iron'),
+    ('Petals', 'Wolves', 'Saints', 'Rivers', 'Echoes', 'Pilots', 'Ghosts',
+     'Horses', 'Tigers', 'Lanterns', 'Sparrows', 'Kings', 'Machines', 'Owls'),
+    ('', '', '', ' Band', ' Trio', ' Quartet', ' Collective', ' Orchestra'))
+
+# the slots a venue or artist can play in a day, three hours apart; no show
+# lasts longer, so the shows of one slot never overlap another's
+SLOTS = (time(13), time(16), time(19), time(22))
+DURATIONS = (60, 90, 120, 150, 180)
+# fridays and saturdays are busier
+WEEKDAY_WEIGHTS = (1.0, 0.8, 0.9, 1.0, 1.6, 1.8, 1.2)
+ZIPF_EXPONENT = 0.9
+
+
+def weighted_genres(rng):
+    weights = [GENRE_WEIGHTS.get(genre, 1) for genre in GENRES]
+    genres = set(rng.choices(GENRES, weights, k=rng.choice((1, 1, 2, 2, 3))))
+    return sorted(genres)
+
+
+def place(rng):
+    city, state, _ = rng.choices(CITIES, [weight for _, _, weight in CITIES])[0]
+    return city, state
+
+
+def phone(rng):
+    return '{}-{}-{:04d}'.format(rng.randint(201, 989), rng.randint(200, 999),
+                                 rng.randint(0, 9999))
+
+
+def generate_venues(count, rng):
+    for i in range(count):
+        city, state = place(rng)
+        name = '{} {} {}'.format(*[rng.choice(words) for words in VENUE_WORDS], i)
+        seeking = rng.random() < 0.3
+        yield {
+            'name': name,
+            'city': city,
+            'state': state,
+            'address': '{} {} St'.format(rng.randint(1, 9999), rng.choice(STREETS)),
+            'phone': phone(rng),
+            'genres': weighted_genres(rng),
+            'website': 'https://venue-{}.example.com'.format(i),
+            'facebook_link': 'https://www.facebook.com/venue{}'.format(i),
+            'image_link': None,
+            'seeking_talent': seeking,
+            'seeking_description': 'Looking for local acts.' if seeking else None
+        }
+
+
+def generate_artists(count, rng):
+    for i in range(count):
+        city, state = place(rng)
+        first, second, suffix = [rng.choice(words) for words in ARTIST_WORDS]
+        seeking = rng.random() < 0.4
+        yield {
+            'name': '{} {}{} {}'.format(first, second, suffix, i),
+            'city': city,
+            'state': state,
+            'phone': phone(rng),
+            'genres': weighted_genres(rng),
+            'website': None,
+            'facebook_link': 'https://www.facebook.com/artist{}'.format(i),
+            'image_link': None,
+            'seeking_venue': seeking,
+            'seeking_description': 'Touring next season.' if seeking else None
+        }
+
+
+def zipf_cum_weights(count, rng, exponent=ZIPF_EXPONENT):
+    # cumulative weights of a Zipf curve over the ids in a random order, so
+    # popularity is not tied to the id
+    ranks = list(range(count))
+    rng.shuffle(ranks)
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in ranks))
+
+
+def weighted_sample(ids, cum_weights, k, rng):
+    # k distinct ids, drawn by weight: oversample and drop repeats, then top
+    # up uniformly when the popular ids keep coming back
+    chosen = {}
+    for _ in range(4):
+        if len(chosen) >= k:
+            break
+        chosen.update(dict.fromkeys(
+            rng.choices(ids, cum_weights=cum_weights, k=2 * (k - len(chosen)))))
+    chosen = list(chosen)[:k]
+    if len(chosen) < k:
+        taken = set(chosen)
+        rest = [id for id in ids if id not in taken]
+        chosen.extend(rng.sample(rest, k - len(chosen)))
+    return chosen
+
+
+def slot_quotas(count, start, days):
+    # shows per (day, slot), proportional to the weekday weights
+    weights = [WEEKDAY_WEIGHTS[(start + timedelta(days=day)).weekday()]
+               for day in range(days)]
+    per_weight = count / (sum(weights) * len(SLOTS))
+    expected = placed = 0
+    for day, weight in enumerate(weights):
+        for slot in SLOTS:
+            expected += per_weight * weight
+            quota = round(expected) - placed
+            placed += quota
+            yield day, slot, quota
+
+
+def busiest_slot(count, start, days):
+    # shows in the busiest slot: there have to be as many venues and artists
+    return max((quota for _, _, quota in slot_quotas(count, start, days)), default=0)
+
+
+def generate_shows(venue_ids, artist_ids, count, start, days, rng):
+    # within a slot every venue and artist appears at most once and shows of
+    # different slots cannot overlap, so the double booking constraints hold
+    quotas = list(slot_quotas(count, start, days))
+    busiest = max((quota for _, _, quota in quotas), default=0)
+    if busiest > min(len(venue_ids), len(artist_ids)):
+        raise ValueError(
+            '{} shows in {} days need at least {} venues and artists'.format(
+                count, days, busiest))
+
+    venue_weights = zipf_cum_weights(len(venue_ids), rng)
+    artist_weights = zipf_cum_weights(len(artist_ids), rng)
+    for day, slot, quota in quotas:
+        if quota <= 0:
+            continue
+        start_time = datetime.combine(
+            start + timedelta(days=day), slot, tzinfo=timezone.utc)
+        venues = weighted_sample(venue_ids, venue_weights, quota, rng)
+        artists = weighted_sample(artist_ids, artist_weights, quota, rng)
+        for venue_id, artist_id in zip(venues, artists):
+            yield {
+                'venue_id': venue_id,
+                'artist_id': artist_id,
+                'start_time': start_time,
+                'duration': rng.choice(DURATIONS)
+            }
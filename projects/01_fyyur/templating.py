@@ -0,0 +1,42 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import os
+import time
+from jinja2 import FileSystemBytecodeCache
+
+#----------------------------------------------------------------------------#
+# Template compilation.
+#----------------------------------------------------------------------------#
+
+# Jinja compiles a template to Python on its first use in every process. The
+# bytecode cache keeps the compiled code on disk, keyed by a checksum of the
+# source, so a new worker only unmarshals it; the warm-up loads every
+# template at boot instead of on the first requests that need them.
+
+
+def page_templates(env):
+    return env.list_templates(filter_func=lambda name: name.endswith('.html'))
+
+
+def warm_templates(env):
+    # compiled once per process, or read from the bytecode cache
+    names = page_templates(env)
+    for name in names:
+        env.get_template(name)
+    return names
+
+
+def setup_templates(app):
+    # call once the template filters are registered: compiling checks that
+    # the filters a template uses exist
+    directory = app.config.get('TEMPLATE_CACHE_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+    if app.config.get('TEMPLATE_WARMUP'):
+        started = time.perf_counter()
+        names = warm_templates(app.jinja_env)
+        app.logger.debug('compiled %d templates in %.1f ms', len(names),
+                         (time.perf_counter() - started) * 1000)
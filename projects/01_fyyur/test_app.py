@@ -0,0 +1,938 @@
+import os
+import sys
+import gzip
+import json
+import queue
+import logging
+import unittest
+import tempfile
+from contextlib import contextmanager
+from logging.handlers import WatchedFileHandler
+from datetime import datetime, timedelta, timezone
+from flask import Flask, url_for
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
+
+from app import app
+from models import db, Venue, Artist, Show, configure_engine
+from queries import venue_detail, venue_directory
+from cache import page_cache
+from querycount import query_budget, QueryBudgetExceeded
+from stats import create_venue_stats, drop_venue_stats, refresh_venue_stats, VENUE_STATS_VIEW
+from routing import replica_health
+from metrics import metrics
+from logs import JsonFormatter, RequestContextFilter, DroppingQueueHandler, file_handler
+from suggest import suggestions, build_suggestions, refresh_suggestions, setup_suggestions
+from assets import assets, build_assets
+from templating import page_templates
+from partitions import create_show_partitions, archive_show_partitions, show_partitions, month_start
+
+test_database_name = "fyyur_test"
+test_database_path = "postgres://{}/{}".format(
+    'localhost:5432', test_database_name)
+test_replica_path = "postgres://{}/{}".format(
+    'localhost:5432', "fyyur_test_replica")
+app.config['SQLALCHEMY_DATABASE_URI'] = test_database_path
+app.config['WTF_CSRF_ENABLED'] = False
+
+
+@contextmanager
+def count_queries():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+@contextmanager
+def replica(uri):
+    # a second database standing in for a read replica
+    app.config['SQLALCHEMY_BINDS'] = {'replica_0': uri}
+    replica_health.clear()
+    try:
+        yield
+    finally:
+        app.config['SQLALCHEMY_BINDS'] = {}
+        replica_health.clear()
+
+
+class FyyurTestCase(unittest.TestCase):
+    """This class represents the fyyur test case"""
+
+    def setUp(self):
+        """Define test variables and initialize app."""
+        self.app = app
+        self.client = self.app.test_client
+        self.context = self.app.app_context()
+        self.context.push()
+        db.session.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        db.session.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        db.session.commit()
+        db.create_all()
+        create_venue_stats()
+        page_cache.clear()
+
+        now = datetime.now(timezone.utc)
+        self.venue = Venue(
+            name='The Musical Hop',
+            city='San Francisco',
+            state='CA',
+            genres=['Jazz'])
+        self.artists = [
+            Artist(name='Guns N Petals', city='San Francisco',
+                   state='CA', genres=['Rock n Roll']),
+            Artist(name='Matt Quevedo', city='New York',
+                   state='NY', genres=['Jazz']),
+            Artist(name='The Wild Sax Band', city='San Francisco',
+                   state='CA', genres=['Jazz', 'Classical'])
+        ]
+        db.session.add(self.venue)
+        db.session.add_all(self.artists)
+        db.session.flush()
+        create_show_partitions(month_start(now, -1), 3)
+        for i, artist in enumerate(self.artists):
+            db.session.add(Show(venue_id=self.venue.id, artist_id=artist.id,
+                                start_time=now - timedelta(days=i + 1)))
+            db.session.add(Show(venue_id=self.venue.id, artist_id=artist.id,
+                                start_time=now + timedelta(days=i + 1)))
+        db.session.commit()
+        refresh_venue_stats()
+        self.venue_id = self.venue.id
+
+    def tearDown(self):
+        """Executed after reach test"""
+        db.session.remove()
+        drop_venue_stats()
+        # archived partitions keep their foreign keys to venues and artists
+        db.engine.execute('DROP SCHEMA IF EXISTS archive CASCADE')
+        db.drop_all()
+        self.context.pop()
+
+    """
+    Venue detail test cases.
+    """
+
+    def test_venue_detail(self):
+        data = venue_detail(self.venue_id)
+
+        self.assertEqual(data['name'], 'The Musical Hop')
+        self.assertEqual(data['past_shows_count'], 3)
+        self.assertEqual(data['upcoming_shows_count'], 3)
+        self.assertEqual(data['upcoming_shows'][0]['artist_name'], 'Guns N Petals')
+        self.assertEqual(data['past_shows'][0]['artist_name'], 'Guns N Petals')
+
+    def test_venue_detail_without_shows(self):
+        Show.query.delete()
+        db.session.commit()
+
+        data = venue_detail(self.venue_id)
+
+        self.assertEqual(data['past_shows'], [])
+        self.assertEqual(data['upcoming_shows_count'], 0)
+
+    def test_venue_detail_query_count(self):
+        db.session.expire_all()
+        with count_queries() as statements:
+            venue_detail(self.venue_id)
+
+        self.assertEqual(len(statements), 1)
+
+    def test_show_venue_query_count(self):
+        self.client().get('/')
+        with count_queries() as statements:
+            res = self.client().get('/venues/{}'.format(self.venue_id))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(statements), 1)
+
+    def test_404_show_venue(self):
+        res = self.client().get('/venues/100000')
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_venue_detail_stats(self):
+        data = venue_detail(self.venue_id)
+
+        self.assertEqual(data['artists_hosted_count'], 3)
+
+    def test_venues_upcoming_counts(self):
+        venue = Venue(name='Park Square Live Music & Coffee',
+                      city='San Francisco', state='CA', genres=['Jazz'])
+        db.session.add(venue)
+        db.session.commit()
+
+        res = self.client().get('/venues')
+        counts = {v['name']: v['num_upcoming_shows']
+                  for area in venue_directory() for v in area['venues']}
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Park Square Live Music &amp; Coffee', res.data)
+        self.assertEqual(counts, {'The Musical Hop': 3,
+                                  'Park Square Live Music & Coffee': 0})
+
+    """
+    Genre filter test cases.
+    """
+
+    def test_genre_filter_artists(self):
+        res = self.client().get('/artists?genre=Jazz')
+
+        self.assertIn(b'Matt Quevedo', res.data)
+        self.assertNotIn(b'Guns N Petals</h5>', res.data)
+
+    def test_genre_facets(self):
+        res = self.client().get('/genres/facets?kind=artists&genre=Jazz')
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn({'genre': 'Classical', 'count': 1}, data['facets'])
+        self.assertIn({'genre': 'Jazz', 'count': 2}, data['facets'])
+
+    """
+    Page cache test cases.
+    """
+
+    def test_show_venue_cached(self):
+        self.client().get('/venues/{}'.format(self.venue_id))
+        with count_queries() as statements:
+            res = self.client().get('/venues/{}'.format(self.venue_id))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(statements), 0)
+        self.assertGreaterEqual(page_cache.stats()['hits'], 1)
+
+    def test_create_show_invalidates_pages(self):
+        artist_id = self.artists[0].id
+        self.client().get('/venues/{}'.format(self.venue_id))
+        self.client().get('/artists/{}'.format(artist_id))
+
+        self.client().post('/shows/create', data={
+            'venue_id': self.venue_id,
+            'artist_id': artist_id,
+            'start_time': '2100-01-01 20:00:00'
+        })
+        res = self.client().get('/venues/{}'.format(self.venue_id))
+
+        self.assertIn(b'4 Upcoming Shows', res.data)
+        self.assertIsNone(page_cache.local.get('artist:{}'.format(artist_id)))
+
+    """
+    Search test cases.
+    """
+
+    def test_search_venues_misspelt(self):
+        res = self.client().post('/venues/search', data={'search_term': 'Musicl Hop'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'The Musical Hop', res.data)
+
+    def test_search_artists_ranked(self):
+        res = self.client().post('/artists/search', data={'search_term': 'Wild Sax'})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'The Wild Sax Band', res.data)
+        self.assertNotIn(b'Matt Quevedo', res.data)
+
+    def test_fulltext_search_ranked_and_escaped(self):
+        db.session.add(Artist(
+            name='Jazz & Blues Collective', city='Oakland', state='CA',
+            genres=['Blues'], seeking_description='Jazz <script>alert(1)</script> nights'))
+        db.session.commit()
+
+        res = self.client().get('/search?q=jazz')
+
+        self.assertEqual(res.status_code, 200)
+        # a name match outranks the genre matches
+        self.assertLess(res.data.index(b'Jazz &amp; Blues Collective'),
+                        res.data.index(b'Matt Quevedo'))
+        self.assertIn(b'The Musical Hop', res.data)
+        self.assertIn(b'<mark>Jazz</mark>', res.data)
+        self.assertNotIn(b'<script>alert', res.data)
+
+    def suggest(self, prefix):
+        res = self.client().get('/search/suggest', query_string={'q': prefix})
+        return [s['name'] for s in res.get_json()['suggestions']]
+
+    def test_suggestions_follow_other_writers(self):
+        build_suggestions()
+        # written as another worker or a catalog command would
+        db.session.add(Venue(name='Velvet Cellar', city='Oakland', state='CA',
+                             genres=['Jazz']))
+        Artist.query.filter_by(name='Matt Quevedo').update(
+            {'name': 'Matthew Quevedo'}, synchronize_session=False)
+        Artist.query.filter_by(name='Guns N Petals').delete(synchronize_session=False)
+        db.session.commit()
+
+        refresh_suggestions(0)
+
+        self.assertEqual(self.suggest('velv'), ['Velvet Cellar'])
+        self.assertEqual(self.suggest('quev'), ['Matthew Quevedo'])
+        self.assertEqual(self.suggest('guns'), [])
+
+    def test_suggestions_built_at_boot(self):
+        suggestions.build([])
+
+        setup_suggestions(app)
+
+        self.assertEqual([s['name'] for s in suggestions.suggest('sax')],
+                         ['The Wild Sax Band'])
+
+    """
+    Show feed test cases.
+    """
+
+    def test_shows_feed_keyset_pages(self):
+        ids = []
+        cursor = None
+        for _ in range(3):
+            query = {'limit': 2}
+            if cursor is not None:
+                query['after'] = cursor
+            data = self.client().get('/shows/feed', query_string=query).get_json()
+            ids.extend(show['id'] for show in data['shows'])
+            cursor = data['next_cursor']
+
+        expected = [show.id for show in Show.query.order_by(Show.start_time, Show.id)]
+        self.assertEqual(ids, expected)
+        self.assertIsNone(cursor)
+
+    def test_shows_next_page_link(self):
+        res = self.client().get('/shows?limit=4&venue_id={}'.format(self.venue_id))
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'after=', res.data)
+        self.assertIn('venue_id={}'.format(self.venue_id).encode(), res.data)
+
+    def test_shows_malformed_cursor(self):
+        for cursor in ('yesterday', '2020-01-01T00:00:00+00:00_x'):
+            res = self.client().get('/shows', query_string={'after': cursor})
+
+            self.assertEqual(res.status_code, 400)
+
+    """
+    Query budget test cases.
+    """
+
+    def test_shows_query_budget(self):
+        with query_budget(1):
+            res = self.client().get('/shows')
+
+        self.assertEqual(res.status_code, 200)
+
+    def test_query_budget_exceeded(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1):
+                Artist.query.all()
+                Venue.query.all()
+
+    def test_repeated_queries_detected(self):
+        with query_budget(10) as recorder:
+            for artist in self.artists:
+                Artist.query.get(artist.id)
+                db.session.expire_all()
+
+        self.assertEqual(list(recorder.repeated().values()), [3])
+
+    """
+    Edit test cases.
+    """
+
+    def artist_form(self, artist, **changes):
+        data = {
+            'version': artist.version,
+            'name': artist.name,
+            'city': artist.city,
+            'state': artist.state,
+            'genres': artist.genres
+        }
+        data.update(changes)
+        return data
+
+    def test_edit_artist_updates_changed_columns(self):
+        artist = self.artists[1]
+        # the handler closes the session, which detaches the fixtures
+        artist_id = artist.id
+        with count_queries() as statements:
+            res = self.client().post('/artists/{}/edit'.format(artist_id),
+                                     data=self.artist_form(artist, city='Boston'))
+        artist = Artist.query.get(artist_id)
+
+        self.assertEqual(res.status_code, 302)
+        self.assertEqual(artist.city, 'Boston')
+        self.assertEqual(artist.version, 2)
+        update = [s for s in statements if s.startswith('UPDATE artists')][0]
+        self.assertIn('city=', update)
+        self.assertNotIn('name=', update)
+
+    def test_edit_artist_without_changes_skips_update(self):
+        artist = self.artists[1]
+        artist_id = artist.id
+        with count_queries() as statements:
+            self.client().post('/artists/{}/edit'.format(artist_id),
+                               data=self.artist_form(artist))
+
+        self.assertFalse([s for s in statements if s.startswith('UPDATE')])
+        self.assertEqual(Artist.query.get(artist_id).version, 1)
+
+    def test_edit_artist_conflict(self):
+        artist = self.artists[1]
+        artist_id = artist.id
+        stale = self.artist_form(artist, city='Boston')
+        self.client().post('/artists/{}/edit'.format(artist_id),
+                           data=self.artist_form(artist, city='Chicago'))
+
+        res = self.client().post('/artists/{}/edit'.format(artist_id), data=stale)
+
+        self.assertEqual(res.status_code, 409)
+        self.assertIn(b'changed by someone else', res.data)
+        self.assertEqual(Artist.query.get(artist_id).city, 'Chicago')
+
+    """
+    JSON api test cases.
+    """
+
+    def test_api_venue(self):
+        res = self.client().get('/api/v1/venues/{}'.format(self.venue_id))
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertTrue(data['success'])
+        self.assertEqual(data['venue']['name'], 'The Musical Hop')
+        self.assertEqual(data['venue']['upcoming_shows_count'], 3)
+        self.assertIsNotNone(res.headers.get('ETag'))
+
+    def test_api_venue_not_modified(self):
+        etag = self.client().get('/api/v1/venues/{}'.format(self.venue_id)).headers['ETag']
+
+        with count_queries() as statements:
+            res = self.client().get('/api/v1/venues/{}'.format(self.venue_id),
+                                    headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res.headers['ETag'], etag)
+        self.assertEqual(res.data, b'')
+        self.assertEqual(len(statements), 2)
+
+    def test_api_artist_etag_changes_with_artist(self):
+        artist = self.artists[1]
+        url = '/api/v1/artists/{}'.format(artist.id)
+        etag = self.client().get(url).headers['ETag']
+        self.client().post('/artists/{}/edit'.format(artist.id),
+                           data=self.artist_form(artist, city='Boston'))
+
+        res = self.client().get(url, headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], etag)
+        self.assertEqual(res.get_json()['artist']['city'], 'Boston')
+
+    def test_api_shows_etag_changes_with_new_show(self):
+        etag = self.client().get('/api/v1/shows').headers['ETag']
+        db.session.add(Show(venue_id=self.venue_id, artist_id=self.artists[0].id,
+                            start_time=datetime.now(timezone.utc) + timedelta(days=10)))
+        db.session.commit()
+
+        res = self.client().get('/api/v1/shows', headers={'If-None-Match': etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(res.get_json()['shows']), 7)
+
+    def test_api_404(self):
+        res = self.client().get('/api/v1/artists/100000')
+
+        self.assertEqual(res.status_code, 404)
+        self.assertFalse(res.get_json()['success'])
+
+    """
+    Booking test cases.
+    """
+
+    def test_double_booking_rejected(self):
+        show = Show.query.filter_by(artist_id=self.artists[0].id).first()
+
+        res = self.client().post('/shows/create', data={
+            'venue_id': self.venue_id,
+            'artist_id': self.artists[1].id,
+            'start_time': (show.start_time + timedelta(minutes=30)).strftime(
+                '%Y-%m-%d %H:%M:%S%z'),
+            'duration': 60
+        })
+
+        self.assertEqual(res.status_code, 409)
+        self.assertIn(b'the venue already has a show at that time', res.data)
+        self.assertEqual(Show.query.count(), 6)
+
+    def test_show_duration_validated(self):
+        for duration in (0, -30, 2000):
+            res = self.client().post('/shows/create', data={
+                'venue_id': self.venue_id,
+                'artist_id': self.artists[1].id,
+                'start_time': '2100-01-01 20:00:00',
+                'duration': duration
+            })
+
+            self.assertEqual(res.status_code, 400)
+        self.assertEqual(Show.query.count(), 6)
+
+        db.session.add(Show(venue_id=self.venue_id, artist_id=self.artists[1].id,
+                            start_time=datetime(2100, 1, 1, 20, tzinfo=timezone.utc),
+                            duration=0))
+        with self.assertRaises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+    def test_venue_availability(self):
+        start = datetime.now(timezone.utc)
+        res = self.client().get('/venues/{}/availability'.format(self.venue_id),
+                                query_string={'start': start.isoformat(), 'days': 7})
+        data = res.get_json()
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['booked']), 3)
+        self.assertEqual(len(data['free']), 4)
+        self.assertEqual(data['free'][0]['start'], start.isoformat())
+
+    """
+    Show partition test cases.
+    """
+
+    def test_create_show_partitions(self):
+        now = datetime.now(timezone.utc)
+        month = month_start(now, 4)
+        show = Show(venue_id=self.venue_id, artist_id=self.artists[0].id,
+                    start_time=datetime(month.year, month.month, 10, tzinfo=timezone.utc))
+        db.session.add(show)
+        db.session.commit()
+
+        names = create_show_partitions(month_start(now), 6)
+        partition = db.session.execute(
+            'SELECT tableoid::regclass::text FROM shows WHERE id = :id',
+            {'id': show.id}).scalar()
+
+        self.assertEqual(len(names), 6)
+        self.assertEqual([name for name, _ in show_partitions()][-6:], names)
+        self.assertEqual(partition, month.strftime('shows_%Y_%m'))
+
+    def test_archive_show_partitions(self):
+        month = month_start(datetime.now(timezone.utc))
+        boundary = datetime(month.year, month.month, 1, tzinfo=timezone.utc)
+        kept = Show.query.filter(Show.start_time >= boundary).count()
+
+        archived = archive_show_partitions(boundary)
+
+        self.assertEqual(archived, [month_start(month, -1).strftime('shows_%Y_%m')])
+        self.assertNotIn(archived[0], [name for name, _ in show_partitions()])
+        self.assertEqual(Show.query.count(), kept)
+
+    """
+    Read replica test cases.
+    """
+
+    def replica_engine(self):
+        engine = db.get_engine(app, bind='replica_0')
+        engine.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        engine.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+        db.Model.metadata.create_all(engine)
+        self.addCleanup(db.Model.metadata.drop_all, engine)
+        return engine
+
+    def replica_show(self):
+        # a show that only exists on the replica
+        engine = self.replica_engine()
+        venue_id = engine.execute(Venue.__table__.insert().values(
+            name='Replica Hall', city='Oakland', state='CA', genres=['Jazz'])
+        ).inserted_primary_key[0]
+        artist_id = engine.execute(Artist.__table__.insert().values(
+            name='Replica Trio', city='Oakland', state='CA', genres=['Jazz'])
+        ).inserted_primary_key[0]
+        engine.execute(Show.__table__.insert().values(
+            venue_id=venue_id, artist_id=artist_id,
+            start_time=datetime.now(timezone.utc)))
+
+    def test_get_reads_from_replica(self):
+        with replica(test_replica_path):
+            self.replica_show()
+            res = self.client().get('/shows/feed')
+
+        self.assertIn(b'Replica Trio', res.data)
+        self.assertNotIn(b'Guns N Petals', res.data)
+
+    def test_post_reads_own_writes_from_primary(self):
+        with replica(test_replica_path):
+            self.replica_show()
+            client = self.client()
+            client.post('/shows/create', data={
+                'venue_id': self.venue_id,
+                'artist_id': self.artists[0].id,
+                'start_time': '2100-01-01 20:00:00'
+            })
+            res = client.get('/shows/feed')
+
+        self.assertIn(b'Guns N Petals', res.data)
+        self.assertNotIn(b'Replica Trio', res.data)
+
+    def test_replica_pages_not_cached_after_write(self):
+        with replica(test_replica_path):
+            # the replica has not caught up with the venue yet
+            engine = self.replica_engine()
+            engine.execute(VENUE_STATS_VIEW)
+            self.addCleanup(engine.execute, 'DROP MATERIALIZED VIEW venue_stats')
+            engine.execute(Venue.__table__.insert().values(
+                id=self.venue_id, name='Lagging Hop', city='Oakland',
+                state='CA', genres=['Jazz']))
+            url = '/venues/{}'.format(self.venue_id)
+            writer = self.client()
+            writer.post('/shows/create', data={
+                'venue_id': self.venue_id,
+                'artist_id': self.artists[0].id,
+                'start_time': '2100-01-01 20:00:00'
+            })
+
+            other = self.client().get(url)
+            # the requests share the test's session; without this the
+            # writer would get the replica's venue from its identity map
+            db.session.remove()
+            own = writer.get(url)
+
+        self.assertIn(b'Lagging Hop', other.data)
+        self.assertIn(b'The Musical Hop', own.data)
+        self.assertIn(b'4 Upcoming Shows', own.data)
+        self.assertIsNone(page_cache.local.get('venue:{}'.format(self.venue_id)))
+
+    def test_unreachable_replica_falls_back_to_primary(self):
+        with replica('postgres://localhost:1/fyyur_test_replica'):
+            res = self.client().get('/shows/feed')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'Guns N Petals', res.data)
+
+    """
+    Static asset test cases.
+    """
+
+    def build_assets(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.addCleanup(assets.load, app.config['ASSETS_DIR'])
+        build_assets(app.static_folder, directory.name)
+        assets.load(directory.name)
+
+    def test_static_urls_fingerprinted(self):
+        self.build_assets()
+        with app.test_request_context():
+            url = url_for('static', filename='css/main.css')
+
+        self.assertRegex(url, r'^/static/build/css/main\.[0-9a-f]{12}\.css$')
+        self.assertIn(url.encode(), self.client().get('/').data)
+
+    def test_static_precompressed(self):
+        self.build_assets()
+        with app.test_request_context():
+            url = url_for('static', filename='css/bootstrap.min.css')
+
+        res = self.client().get(url, headers={'Accept-Encoding': 'gzip'})
+        plain = self.client().get(url)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(res.headers['Vary'], 'Accept-Encoding')
+        self.assertIn('immutable', res.headers['Cache-Control'])
+        self.assertEqual(gzip.decompress(res.data), plain.data)
+        self.assertNotIn('Content-Encoding', plain.headers)
+
+    """
+    Template compilation test cases.
+    """
+
+    def test_templates_precompiled(self):
+        names = page_templates(app.jinja_env)
+        cached = [name for name in os.listdir(app.config['TEMPLATE_CACHE_DIR'])
+                  if name.startswith('__jinja2_')]
+
+        self.assertIn('layouts/main.html', names)
+        self.assertGreaterEqual(len(cached), len(names))
+
+    """
+    Catalog import test cases.
+    """
+
+    def catalog_file(self, name, text=''):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def read_rejects(self, path):
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_import_venues_csv(self):
+        source = self.catalog_file('venues.csv', (
+            'name,city,state,genres,website,seeking_talent\n'
+            'Velvet Cellar,Oakland,CA,Jazz; Blues,https://velvet.example.com,true\n'
+            ',Oakland,CA,Jazz,,\n'
+            'Rusty Room,Oakland,XX,Jazz,,\n'
+            'Blue Note,Oakland,CA,Jazz,not a url,\n'))
+        rejects = self.catalog_file('rejects.ndjson')
+
+        result = app.test_cli_runner().invoke(args=[
+            'catalog', 'import', 'venues', source, '--rejects', rejects])
+        venue = Venue.query.filter_by(name='Velvet Cellar').one()
+        rejected = self.read_rejects(rejects)
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Imported 1 venues', result.output)
+        self.assertEqual(Venue.query.count(), 2)
+        self.assertEqual(venue.genres, ['Jazz', 'Blues'])
+        self.assertTrue(venue.seeking_talent)
+        self.assertEqual([r['line'] for r in rejected], [3, 4, 5])
+        self.assertIn('name: Name required', rejected[0]['error'])
+        self.assertIn('state:', rejected[1]['error'])
+        self.assertIn('website: Invalid URL', rejected[2]['error'])
+        self.assertEqual(rejected[2]['row']['name'], 'Blue Note')
+
+    def test_import_shows_ndjson_references(self):
+        # the cli runner's app context removes the session, detaching the
+        # fixtures, so their ids are read first
+        artist_id = self.artists[1].id
+        source = self.catalog_file('shows.ndjson', '\n'.join(json.dumps(row) for row in (
+            {'venue_name': 'The Musical Hop', 'artist_name': 'Matt Quevedo',
+             'start_time': '2100-01-01 20:00:00'},
+            {'venue_id': self.venue_id, 'artist_id': 100000,
+             'start_time': '2100-01-02 20:00:00'},
+            {'venue_name': 'Nowhere', 'artist_id': self.artists[0].id,
+             'start_time': '2100-01-03 20:00:00'})) + '\n{not json\n')
+        rejects = self.catalog_file('rejects.ndjson')
+
+        result = app.test_cli_runner().invoke(args=[
+            'catalog', 'import', 'shows', source, '--rejects', rejects])
+        rejected = self.read_rejects(rejects)
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(Show.query.filter_by(artist_id=artist_id).count(), 3)
+        self.assertEqual([r['line'] for r in rejected], [4, 2, 3])
+        self.assertIn('unknown artist_id 100000', rejected[1]['error'])
+        self.assertIn("unknown or ambiguous venue_name 'Nowhere'", rejected[2]['error'])
+
+    def test_import_shows_rejects_conflicts(self):
+        show = Show.query.filter_by(artist_id=self.artists[0].id).first()
+        artist_id = self.artists[1].id
+        source = self.catalog_file('shows.csv', (
+            'venue_id,artist_id,start_time,duration\n'
+            '{0},{1},2100-02-01 20:00:00,\n'
+            '{0},{2},{3},60\n'
+            '{0},{1},2100-02-01 21:00:00,60\n'
+            '{0},{1},2100-02-02 20:00:00,90\n').format(
+                self.venue_id, artist_id, self.artists[0].id,
+                (show.start_time + timedelta(minutes=30)).strftime('%Y-%m-%d %H:%M:%S%z')))
+        rejects = self.catalog_file('rejects.ndjson')
+
+        result = app.test_cli_runner().invoke(args=[
+            'catalog', 'import', 'shows', source, '--rejects', rejects])
+        rejected = self.read_rejects(rejects)
+        durations = [duration for (duration,) in db.session.query(Show.duration).filter(
+            Show.artist_id == artist_id, Show.start_time >= datetime(2100, 2, 1, tzinfo=timezone.utc)
+        ).order_by(Show.start_time)]
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('Imported 2 shows', result.output)
+        self.assertEqual(durations, [120, 90])
+        self.assertEqual([r['line'] for r in rejected], [3, 4])
+        self.assertIn('overlaps another booking', rejected[0]['error'])
+
+    """
+    Catalog export test cases.
+    """
+
+    def test_export_ndjson(self):
+        res = self.client().get('/export/artists')
+        rows = [json.loads(line) for line in res.data.decode().splitlines()]
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.mimetype, 'application/x-ndjson')
+        self.assertEqual(sorted(row['name'] for row in rows),
+                         ['Guns N Petals', 'Matt Quevedo', 'The Wild Sax Band'])
+        self.assertNotIn('search_document', rows[0])
+
+    def test_export_since(self):
+        since = db.session.query(func.max(Artist.updated_at)).scalar()
+        artist = self.artists[1]
+        self.client().post('/artists/{}/edit'.format(artist.id),
+                           data=self.artist_form(artist, city='Boston'))
+
+        res = self.client().get('/export/artists', query_string={
+            'format': 'csv', 'since': (since + timedelta(microseconds=1)).isoformat()})
+        lines = res.data.decode().splitlines()
+
+        self.assertEqual(res.mimetype, 'text/csv')
+        self.assertTrue(lines[0].startswith('id,name,'))
+        self.assertEqual(len(lines), 2)
+        self.assertIn('Matt Quevedo', lines[1])
+        self.assertEqual(self.client().get('/export/artists?since=yesterday').status_code, 400)
+
+    def test_export_import_round_trip(self):
+        self.artists[1].seeking_venue = True
+        db.session.commit()
+        last_artist = max(artist.id for artist in self.artists)
+        shows = sorted((s.venue_id, s.artist_id, s.start_time, s.duration)
+                       for s in Show.query)
+        runner = app.test_cli_runner()
+        files = {kind: self.catalog_file(kind + '.csv') for kind in ('artists', 'shows')}
+        for kind, path in files.items():
+            result = runner.invoke(args=[
+                'catalog', 'export', kind, '--format', 'csv', '-o', path])
+            self.assertEqual(result.exit_code, 0, result.output)
+        Show.query.delete()
+        db.session.commit()
+
+        for kind, path in files.items():
+            result = runner.invoke(args=['catalog', 'import', kind, path])
+            self.assertIn('Imported {} {}'.format(len(shows) if kind == 'shows' else 3, kind),
+                          result.output)
+            self.assertIn(', 0 rejected', result.output)
+
+        copies = {a.name: a.seeking_venue for a in Artist.query.filter(Artist.id > last_artist)}
+        self.assertEqual(copies, {'Guns N Petals': False, 'Matt Quevedo': True,
+                                  'The Wild Sax Band': False})
+        self.assertEqual(sorted((s.venue_id, s.artist_id, s.start_time, s.duration)
+                                for s in Show.query), shows)
+
+    """
+    Synthetic data test cases.
+    """
+
+    def test_generate_catalog(self):
+        runner = app.test_cli_runner()
+
+        result = runner.invoke(args=[
+            'catalog', 'generate', '--venues', '20', '--artists', '30',
+            '--shows', '300', '--past-days', '10', '--future-days', '20'])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(Venue.query.count(), 21)
+        self.assertEqual(Artist.query.count(), 33)
+        self.assertEqual(Show.query.count(), 306)
+
+    def test_generate_needs_enough_venues(self):
+        result = app.test_cli_runner().invoke(args=[
+            'catalog', 'generate', '--venues', '2', '--artists', '2',
+            '--shows', '1000', '--past-days', '1', '--future-days', '1'])
+
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertEqual(Venue.query.count(), 1)
+
+    """
+    Metrics test cases.
+    """
+
+    def test_metrics(self):
+        self.client().get('/venues/{}'.format(self.venue_id))
+        res = self.client().get('/metrics')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'fyyur_http_requests_total{endpoint="show_venue",'
+                      b'method="GET",status="200"}', res.data)
+        self.assertIn(b'fyyur_http_request_duration_seconds_bucket{'
+                      b'endpoint="show_venue",method="GET",le="+Inf"}', res.data)
+        self.assertIn(b'fyyur_db_queries_total{endpoint="show_venue"}', res.data)
+        self.assertIn(b'fyyur_db_pool_wait_seconds_count', res.data)
+
+    def test_metrics_reset_in_forked_worker(self):
+        self.client().get('/venues/{}'.format(self.venue_id))
+
+        pid = os.fork()
+        if pid == 0:
+            # the child exits at once, without touching the db connection
+            os._exit(0 if metrics.pid == os.getpid() and not metrics.requests else 1)
+        _, status = os.waitpid(pid, 0)
+
+        self.assertTrue(metrics.requests)
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+
+    """
+    Logging test cases.
+    """
+
+    def log_line(self, handler, record):
+        # as the listener thread would format a record queued by a request
+        handler.handle(record)
+        return json.loads(JsonFormatter().format(handler.queue.get_nowait()))
+
+    def test_json_log_record(self):
+        handler = DroppingQueueHandler(queue.Queue(1))
+        handler.addFilter(RequestContextFilter())
+        record = app.logger.makeRecord(
+            app.logger.name, logging.INFO, __file__, 1, 'request %s', ('done',),
+            None, extra={'status': 200})
+
+        with app.test_request_context('/venues/{}'.format(self.venue_id)):
+            line = self.log_line(handler, record)
+
+        self.assertEqual(line['message'], 'request done')
+        self.assertEqual(line['level'], 'INFO')
+        self.assertEqual(line['route'], '/venues/<int:venue_id>')
+        self.assertEqual(line['endpoint'], 'show_venue')
+        self.assertEqual(line['method'], 'GET')
+        self.assertEqual(line['path'], '/venues/{}'.format(self.venue_id))
+        self.assertEqual(line['status'], 200)
+        self.assertNotIn('exception', line)
+
+    def test_json_log_exception_and_drops(self):
+        handler = DroppingQueueHandler(queue.Queue(1))
+        try:
+            raise ValueError('boom')
+        except ValueError:
+            record = app.logger.makeRecord(
+                app.logger.name, logging.ERROR, __file__, 1, 'failed', (),
+                sys.exc_info())
+
+        line = self.log_line(handler, record)
+        handler.handle(record)
+        handler.handle(record)
+
+        self.assertIn('ValueError: boom', line['exception'])
+        self.assertNotIn('route', line)
+        self.assertEqual(handler.dropped, 1)
+
+    def test_log_file_per_rotating_worker(self):
+        shared = file_handler({'LOG_FILE': 'logs/error.log'})
+        rotating = file_handler({'LOG_FILE': 'logs/error.log', 'LOG_ROTATION': 'size'})
+        self.addCleanup(shared.close)
+        self.addCleanup(rotating.close)
+
+        self.assertIsInstance(shared, WatchedFileHandler)
+        self.assertEqual(shared.baseFilename, os.path.abspath('logs/error.log'))
+        self.assertEqual(rotating.baseFilename,
+                         os.path.abspath('logs/error-{}.log'.format(os.getpid())))
+
+    """
+    Engine configuration test cases.
+    """
+
+    def test_statement_timeout(self):
+        timeout = db.session.execute('SHOW statement_timeout').scalar()
+
+        self.assertEqual(timeout, '5s')
+
+    def test_engine_options_postgresql_only(self):
+        sqlite_app = Flask(__name__)
+        sqlite_app.config.from_object('config')
+        sqlite_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        configure_engine(sqlite_app)
+
+        self.assertEqual(sqlite_app.config['SQLALCHEMY_ENGINE_OPTIONS'], {})
+        self.assertIn('statement_timeout=5000', app.config[
+            'SQLALCHEMY_ENGINE_OPTIONS']['connect_args']['options'])
+
+
+# Make the tests conveniently executable
+if __name__ == "__main__":
+    unittest.main()
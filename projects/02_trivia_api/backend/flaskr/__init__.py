@@ -11,6 +11,7 @@ from flask_cors import CORS
 import random
 
 from models import setup_db, Question, Category
+from querycount import setup_query_instrumentation
 
 QUESTIONS_PER_PAGE = 10
 
@@ -31,6 +32,7 @@ def create_app(test_config=None):
     app = Flask(__name__)
     setup_db(app)
     CORS(app)
+    setup_query_instrumentation(app)
 
     '''
  Use the after_request decorator to set Access-Control-Allow
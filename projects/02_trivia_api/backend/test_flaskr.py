@@ -5,6 +5,7 @@ from flask_sqlalchemy import SQLAlchemy
 
 from flaskr import create_app
 from models import setup_db, Question, Category
+from querycount import query_budget
 
 
 class TriviaTestCase(unittest.TestCase):
@@ -77,6 +78,12 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['total_questions'])
         self.assertTrue(len(data['questions']))
 
+    def test_get_questions_query_budget(self):
+        with query_budget(3):
+            res = self.client().get('/questions')
+
+        self.assertEqual(res.status_code, 200)
+
     def test_get_categories(self):
         res = self.client().get('/categories')
         data = json.loads(res.data)
@@ -12,6 +12,7 @@ from flask_cors import CORS
 from sqlalchemy.exc import SQLAlchemyError
 from models import setup_db, Movie, Actor
 from auth import AuthError, requires_auth
+from querycount import setup_query_instrumentation
 
 
 def create_app(test_config=None):
@@ -19,6 +20,7 @@ def create_app(test_config=None):
     app = Flask(__name__)
     setup_db(app)
     CORS(app)
+    setup_query_instrumentation(app)
 
     # Routes
     '''
@@ -5,6 +5,7 @@ from flask_sqlalchemy import SQLAlchemy
 
 from app import create_app
 from models import setup_db, Actor, Movie
+from querycount import query_budget
 
 class AgencyTestCase(unittest.TestCase):
     """This class represents the agency test case"""
@@ -86,6 +87,12 @@ class AgencyTestCase(unittest.TestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(data['success'], True)
 
+    def test_get_actors_query_budget(self):
+        with query_budget(1):
+            res = self.client().get('/actors', headers=self.header_casting_assistant)
+
+        self.assertEqual(res.status_code, 200)
+
     def test_401_if_fetching_actors_without_token(self):
         res = self.client().get('/actors')
         data = json.loads(res.data)